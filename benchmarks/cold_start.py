@@ -0,0 +1,72 @@
+"""Cold start of vm-tutorial.py: the time to the first rendered page in a fresh process.
+
+Each repeat starts a new Python process that imports Streamlit, runs the first page of
+the app headlessly (with AppTest) and then checks the Beat Path winners, the first
+interaction that needs pref_voting (and its JIT-compiled code).  The report gives the
+median of each step in seconds.  With ``--no-jit-cache`` numba gets an empty cache
+directory, which shows the cost of a dyno that skipped the warmup of bin/post_compile.
+
+Usage (from the repository root)::
+
+    python benchmarks/cold_start.py --repeats 5
+    python benchmarks/cold_start.py --no-jit-cache
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(REPO_DIR, "vm-tutorial.py")
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout={timeout}).run()
+first_page = time.perf_counter()
+if at.exception:
+    raise SystemExit("; ".join(e.value for e in at.exception))
+multiselect = [m for m in at.multiselect if "Beat Path" in str(m.label)][0]
+multiselect.set_value([multiselect.options[0]])
+[b for b in at.button if b.label == "Check Beat Path winners"][0].click().run()
+beat_path = time.perf_counter()
+print(json.dumps({{"import_streamlit": imported - start, "first_page": first_page - imported, "first_beat_path": beat_path - first_page}}))
+"""
+
+
+def cold_start(timeout, env):
+    output = subprocess.run([sys.executable, "-c", CHILD.format(app=APP, timeout=timeout)], cwd=REPO_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeats", type=int, default=3, help="number of fresh processes (default %(default)s)")
+    parser.add_argument("--timeout", type=float, default=300, help="timeout of a single run in seconds (default %(default)s)")
+    parser.add_argument("--no-jit-cache", action="store_true", help="start numba with an empty cache directory")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        if args.no_jit_cache:
+            env["NUMBA_CACHE_DIR"] = cache_dir
+        runs = list()
+        for _ in range(args.repeats):
+            runs.append(cold_start(args.timeout, env))
+            print(" ".join(f"{step} {seconds:.2f}s" for step, seconds in runs[-1].items()), file=sys.stderr)
+    report = {step: float(np.median([run[step] for run in runs])) for step in runs[0]}
+    report["time_to_first_page"] = report["import_streamlit"] + report["first_page"]
+    print(json.dumps({"jit_cache": not args.no_jit_cache, "repeats": args.repeats, "median_s": report}, indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Throughput of the batch grader (profile_analysis.grading) on synthetic homework.
+
+Every student of a class gets one of ``--profiles`` random profiles (by seed, as shown in
+the tutorial) and submits a winning set for each voting method; about half of the
+submissions are the correct winners.  The grader is timed with each number of worker
+processes in ``--workers`` and the throughput is reported in submissions per second.
+
+Usage (from the repository root)::
+
+    python benchmarks/grading_throughput.py --students 500 --profiles 50 --workers 1,2,4
+"""
+
+import argparse
+import json
+import os
+import string
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profile_analysis import voting_methods  # noqa: E402
+from profile_analysis.grading import grade_submissions, submission_profile  # noqa: E402
+from profile_analysis.analysis import ProfileAnalysis  # noqa: E402
+
+
+def synthetic_submissions(students, profiles, num_cands, num_voters, seed=0):
+    rng = np.random.default_rng(seed)
+    settings = [{"num_cands": num_cands, "num_voters": num_voters, "seed": int(s)} for s in rng.integers(2**32, size=profiles)]
+    answers = [ProfileAnalysis(submission_profile(setting)) for setting in settings]
+    submissions = list()
+    for student in range(students):
+        p = int(rng.integers(profiles))
+        for vm_name in voting_methods:
+            if rng.random() < 0.5:
+                winners = answers[p].winners(vm_name)
+            else:
+                winners = sorted(rng.choice(num_cands, size=int(rng.integers(1, num_cands + 1)), replace=False))
+            submissions.append({"id": f"{student}:{vm_name}", **settings[p], "method": vm_name,
+                                "winners": [string.ascii_letters[c] for c in winners]})
+    return submissions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, default=500, help="number of students (default %(default)s)")
+    parser.add_argument("--profiles", type=int, default=50, help="number of distinct profiles (default %(default)s)")
+    parser.add_argument("--cands", type=int, default=5, help="number of candidates (default %(default)s)")
+    parser.add_argument("--voters", type=int, default=11, help="number of voters (default %(default)s)")
+    parser.add_argument("--workers", default="1,2,4", help="numbers of worker processes, comma separated (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    submissions = synthetic_submissions(args.students, args.profiles, args.cands, args.voters)
+    report = list()
+    for workers in (int(w) for w in args.workers.split(",")):
+        results, stats = grade_submissions(submissions, workers=workers, chunk_size=max(1, args.profiles // (2 * workers)))
+        stats["workers"] = workers
+        stats["correct"] = sum(bool(r.get("correct")) for r in results)
+        report.append(stats)
+        print(f"{workers} workers: {stats['submissions']} submissions, {stats['evaluations']} evaluations, "
+              f"{stats['seconds']:.2f}s, {stats['submissions_per_second']:.0f} submissions/s", file=sys.stderr)
+    print(json.dumps(report, indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+"""Load test of vm-tutorial.py: simulated students using one Streamlit server at the same time.
+
+The harness starts the app with ``streamlit run`` (or uses the server at ``--url``) and
+connects simulated students to it over the websocket that the browser uses.  Each student
+opens the page and then, until the time of the concurrency level is up, repeats a mix of
+the interactions of a class:
+
+* ``generate_profile``: submitting the sidebar form with random numbers of candidates and
+  voters (or, sometimes, a fixed profile),
+* ``margin_pair``: choosing a pair in the "Margin Calculations" selectbox,
+* ``answer``: switching to the tab of a random voting method and selecting candidates in
+  its multiselect,
+* ``check``: pressing "Check <method> winners", which also sends the explanation of the
+  winners (the content of the explainer expander).
+
+Switching tabs and opening an expander happen in the browser without a rerun, so they
+are the time a student spends between two interactions (``--think-time``, exponentially
+distributed).  Every rerun is timed from the message of the student to the end of the
+script run, including the reruns of a check that waits for the background workers.
+
+The concurrency levels run one after the other with new sessions.  For each level the
+report gives the median, 95th and 99th percentile rerun latency in seconds (overall and
+for each interaction), the throughput in reruns per second, the errors, and the CPU
+(in cores) and resident memory (in MB) of the server and its worker processes.  The
+report is written as JSON.
+
+The students speak the protocol of the browser: the ``BackMsg`` and ``ForwardMsg``
+protobufs of ``streamlit.proto`` over the websocket ``/_stcore/stream``.  These are
+internal to Streamlit; the harness was written against Streamlit 1.66 and may need
+changes for other versions.  It also needs ``websockets`` (see benchmarks/requirements.txt).
+
+Usage (from the repository root)::
+
+    python benchmarks/load_test.py --students 1,5,10,20 --duration 60 --output load.json
+    python benchmarks/load_test.py --students 10 --think-time 0.5 --fixed-fraction 0
+    python benchmarks/load_test.py --url ws://localhost:8501 --server-pid 12345
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.asyncio.client import connect
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(REPO_DIR, "vm-tutorial.py")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from rerun_latency import environment  # noqa: E402
+
+# the interactions of a student after the page is loaded, with their weights
+ACTIONS = {
+    "generate_profile": 1,
+    "margin_pair": 2,
+    "answer": 4,
+    "check": 4,
+}
+
+# the end of a script run (a run that ends early for a rerun is followed by the rerun)
+FINISHED = (
+    ForwardMsg.FINISHED_SUCCESSFULLY,
+    ForwardMsg.FINISHED_WITH_COMPILE_ERROR,
+    ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+)
+
+
+def parse_levels(levels):
+    """Parse "1,5,10" into [1, 5, 10]."""
+    return [int(n) for n in levels.split(",")]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, timeout=120):
+    """Start the app on ``port``, returning the process once the server is healthy."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP,
+         "--server.headless", "true", "--server.port", str(port),
+         "--server.enableXsrfProtection", "false", "--browser.gatherUsageStats", "false"],
+        cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"the server exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"the server did not start in {timeout} seconds")
+
+
+class ProcessSampler:
+    """CPU time and resident memory of a process and its descendants, read from /proc (Linux only)."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.tick = os.sysconf("SC_CLK_TCK")
+        self.page_mb = os.sysconf("SC_PAGE_SIZE") / 2**20
+
+    def _processes(self):
+        children = dict()
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            children.setdefault(int(fields[1]), list()).append((int(entry), fields))
+        processes, todo = list(), [self.pid]
+        while todo:
+            pid = todo.pop()
+            processes += children.get(pid, list())
+            todo += [child for child, _ in children.get(pid, list())]
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                processes.append((self.pid, f.read().rsplit(")", 1)[1].split()))
+        except OSError:
+            pass
+        return processes
+
+    def sample(self):
+        """The CPU seconds used so far and the resident memory in MB (None when /proc can't be read)."""
+        processes = self._processes()
+        if not processes:
+            return None, None
+        # utime and stime are the 12th and 13th fields after the name
+        cpu = sum(int(fields[11]) + int(fields[12]) for _, fields in processes) / self.tick
+        rss = 0
+        for pid, _ in processes:
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    rss += int(f.read().split()[1])
+            except OSError:
+                pass
+        return cpu, rss * self.page_mb
+
+
+class Student:
+    """A browser session of the app, driven by a random student."""
+
+    def __init__(self, url, rng, fixed_fraction=0.1, timeout=300):
+        self.url = url
+        self.rng = rng
+        self.fixed_fraction = fixed_fraction
+        self.timeout = timeout
+        self.websocket = None
+        self.page_script_hash = ""
+        # the widgets of the page by label, and the values the browser sends back
+        self.widgets = dict()
+        self.values = dict()
+        # the multiselect of the tab the student is on
+        self.method_label = None
+
+    async def open(self):
+        self.websocket = await connect(f"{self.url}/_stcore/stream", subprotocols=["streamlit"], max_size=None)
+        return await self.rerun()
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    def _record_widget(self, delta):
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        widget = getattr(element, kind, None)
+        if getattr(widget, "id", "") and getattr(widget, "label", ""):
+            self.widgets[widget.label] = (kind, widget, delta.fragment_id)
+
+    async def rerun(self, trigger=None, fragment_id=""):
+        """Send the values of the widgets (and press ``trigger``), returning the duration of the rerun.
+
+        Raises RuntimeError when the script raised an exception.
+        """
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.page_script_hash = self.page_script_hash
+        state.fragment_id = fragment_id
+        state.widget_states.SetInParent()
+        for widget_state in self.values.values():
+            state.widget_states.widgets.append(widget_state)
+        if trigger is not None:
+            pressed = state.widget_states.widgets.add(id=trigger)
+            pressed.trigger_value = True
+        if not fragment_id:
+            self.widgets.clear()
+        errors = list()
+        start = time.perf_counter()
+        await self.websocket.send(msg.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self.websocket.recv(), self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                self.page_script_hash = forward.new_session.main_script_hash
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                if forward.delta.new_element.WhichOneof("type") == "exception":
+                    errors.append(forward.delta.new_element.exception.message)
+                self._record_widget(forward.delta)
+            elif kind == "script_finished" and forward.script_finished in FINISHED:
+                break
+        duration = time.perf_counter() - start
+        if not fragment_id:
+            # the values of the widgets that are gone are forgotten, as in the browser
+            ids = {widget.id for _, widget, _ in self.widgets.values()}
+            self.values = {id_: value for id_, value in self.values.items() if id_ in ids}
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return duration
+
+    def _set(self, label, **value):
+        _, widget, _ = self.widgets[label]
+        self.values[widget.id] = WidgetState(id=widget.id, **value)
+
+    def _method_labels(self):
+        return [label for label, (kind, _, _) in self.widgets.items()
+                if kind == "multiselect" and label.startswith("Which candidates are the ")]
+
+    async def generate_profile(self):
+        fixed = ""
+        fixed_profiles = [option for option in self.widgets["Choose a profile"][1].options if option]
+        if fixed_profiles and self.rng.random() < self.fixed_fraction:
+            fixed = self.rng.choice(fixed_profiles)
+        for label in ("Number of candidates", "Number of Voters"):
+            if label in self.widgets and self.widgets[label][0] == "slider":
+                slider = self.widgets[label][1]
+                value = self.rng.randint(int(slider.min), int(slider.max))
+                self._set(label, double_array_value={"data": [value]})
+        self._set("Choose a profile", string_value=fixed)
+        self.method_label = None
+        submit = [widget.id for label, (kind, widget, _) in self.widgets.items()
+                  if kind == "button" and label == "Generate Profile"][0]
+        return await self.rerun(trigger=submit)
+
+    async def margin_pair(self):
+        labels = [label for label, (kind, _, _) in self.widgets.items() if kind == "selectbox" and "head-to-head" in label]
+        if not labels:
+            return None
+        _, widget, fragment_id = self.widgets[labels[0]]
+        self._set(labels[0], string_value=self.rng.choice(list(widget.options)))
+        return await self.rerun(fragment_id=fragment_id)
+
+    async def answer(self):
+        labels = self._method_labels()
+        if not labels:
+            return None
+        label = self.method_label = self.rng.choice(labels)
+        _, widget, fragment_id = self.widgets[label]
+        options = list(widget.options)
+        answer = self.rng.sample(options, self.rng.randint(1, len(options)))
+        self._set(label, string_array_value={"data": answer})
+        return await self.rerun(fragment_id=fragment_id)
+
+    async def check(self):
+        labels = self._method_labels()
+        if not labels:
+            return None
+        # the answer of the current tab is checked, or a random tab is checked without an answer
+        label = self.method_label if self.method_label in labels else self.rng.choice(labels)
+        method = label.replace("Which candidates are the ", "").replace(" winners?", "")
+        _, button, fragment_id = self.widgets[f"Check {method} winners"]
+        return await self.rerun(trigger=button.id, fragment_id=fragment_id)
+
+
+async def run_student(student, deadline, think_time, record):
+    """Open the page and interact with it until ``deadline`` (a time of the event loop)."""
+    loop = asyncio.get_running_loop()
+    actions, weights = list(ACTIONS), list(ACTIONS.values())
+    try:
+        record("initial_load", await student.open())
+        while loop.time() < deadline:
+            await asyncio.sleep(min(student.rng.expovariate(1 / think_time) if think_time else 0, max(0, deadline - loop.time())))
+            if loop.time() >= deadline:
+                break
+            action = student.rng.choices(actions, weights)[0]
+            try:
+                duration = await getattr(student, action)()
+            except (RuntimeError, KeyError, IndexError, asyncio.TimeoutError) as e:
+                record(action, None, f"{type(e).__name__}: {e}")
+                continue
+            if duration is not None:
+                record(action, duration)
+    except Exception as e:
+        record("session", None, f"{type(e).__name__}: {e}")
+    finally:
+        await student.close()
+
+
+def summarize(durations):
+    if not durations:
+        return {"n": 0}
+    durations = np.array(durations)
+    return {
+        "n": int(len(durations)),
+        "p50_s": float(np.percentile(durations, 50)),
+        "p95_s": float(np.percentile(durations, 95)),
+        "p99_s": float(np.percentile(durations, 99)),
+        "max_s": float(durations.max()),
+    }
+
+
+async def run_level(url, students, duration, think_time, fixed_fraction, timeout, seed, sampler=None, sample_interval=0.5, log=print):
+    """Run ``students`` students for ``duration`` seconds, returning the results of the level."""
+    samples, errors = dict(), list()
+
+    def record(action, seconds, error=None):
+        if error is not None:
+            errors.append({"action": action, "error": error})
+            log(f"{students:4} students  {action:20} {error}")
+        else:
+            samples.setdefault(action, list()).append(seconds)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + duration
+    cpu_start, _ = sampler.sample() if sampler else (None, None)
+    rss = list()
+
+    async def sample_memory():
+        while True:
+            rss.append(sampler.sample()[1])
+            await asyncio.sleep(sample_interval)
+
+    monitor = asyncio.create_task(sample_memory()) if sampler else None
+    await asyncio.gather(*(
+        run_student(Student(url, random.Random(seed * 100003 + i), fixed_fraction, timeout), deadline, think_time, record)
+        for i in range(students)))
+    elapsed = loop.time() - start
+    cpu_end = None
+    if monitor is not None:
+        monitor.cancel()
+        cpu_end, _ = sampler.sample()
+
+    reruns = [d for action, durations in samples.items() if action != "initial_load" for d in durations]
+    result = {
+        "students": students,
+        "duration_s": elapsed,
+        "reruns": len(reruns),
+        "throughput_per_s": len(reruns) / elapsed,
+        "latency": summarize(reruns),
+        "actions": {action: summarize(durations) for action, durations in sorted(samples.items())},
+        "errors": len(errors),
+        "error_examples": errors[:10],
+    }
+    if cpu_start is not None and cpu_end is not None:
+        result["cpu_cores"] = (cpu_end - cpu_start) / elapsed
+    rss = [r for r in rss if r is not None]
+    if rss:
+        result["rss_mb"] = {"mean": float(np.mean(rss)), "max": float(max(rss))}
+    latency = result["latency"]
+    log(f"{students:4} students  {len(reruns):6} reruns  {result['throughput_per_s']:6.2f}/s"
+        f"  p50 {latency.get('p50_s', float('nan')):6.3f}s  p95 {latency.get('p95_s', float('nan')):6.3f}s"
+        f"  p99 {latency.get('p99_s', float('nan')):6.3f}s  cpu {result.get('cpu_cores', float('nan')):5.2f}"
+        f"  rss {result.get('rss_mb', {}).get('max', float('nan')):7.1f} MB  errors {len(errors)}")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", default="1,5,10,20", help="numbers of concurrent students, comma separated (default %(default)s)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds each concurrency level runs (default %(default)s)")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between two interactions of a student (default %(default)s)")
+    parser.add_argument("--fixed-fraction", type=float, default=0.1, help="fraction of the generated profiles that are fixed profiles (default %(default)s)")
+    parser.add_argument("--timeout", type=float, default=300, help="timeout of a single rerun in seconds (default %(default)s)")
+    parser.add_argument("--url", help="websocket URL of a running server, e.g. ws://localhost:8501 (default: start one)")
+    parser.add_argument("--server-pid", type=int, help="process of the server at --url, for the CPU and memory")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random students (default %(default)s)")
+    parser.add_argument("--output", help="where to write the JSON report (default: standard output)")
+    parser.add_argument("--quiet", action="store_true", help="do not print the progress")
+    args = parser.parse_args(argv)
+
+    log = (lambda msg: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+    started = datetime.now(timezone.utc)
+    server, url, pid = None, args.url, args.server_pid
+    if url is None:
+        port = free_port()
+        server = start_server(port)
+        url, pid = f"ws://localhost:{port}", server.pid
+    sampler = ProcessSampler(pid) if pid is not None and os.path.isdir("/proc") else None
+
+    levels = list()
+    try:
+        for level, students in enumerate(parse_levels(args.students)):
+            levels.append(asyncio.run(run_level(
+                url, students, args.duration, args.think_time, args.fixed_fraction, args.timeout,
+                seed=args.seed + level, sampler=sampler, log=log)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "started": started.isoformat(),
+        "duration_s": (datetime.now(timezone.utc) - started).total_seconds(),
+        "environment": dict(environment(), cpu_count=os.cpu_count()),
+        "settings": {
+            "students": args.students, "duration_s": args.duration, "think_time_s": args.think_time,
+            "fixed_fraction": args.fixed_fraction, "url": args.url, "seed": args.seed,
+        },
+        "levels": levels,
+    }
+    output = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 1 if any(level["errors"] for level in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""Rerun latency of vm-tutorial.py, measured headlessly with Streamlit's AppTest.
+
+For every profile in the benchmark (a grid of random profiles with different numbers
+of candidates and voters, optionally in the large election mode, and every fixed
+profile) the suite times the reruns a student triggers:
+
+* ``generate_profile``: submitting the sidebar form,
+* ``margin_pair``: choosing a pair in the "Margin Calculations" selectbox,
+* ``answer:<method>``: selecting a candidate in the multiselect of a voting method tab,
+* ``check:<method>``: pressing "Check <method> winners" (which also renders the explanation),
+
+plus ``initial_load``, the first run of the script in a new session.  Before the timed
+sessions, a first session checks every method once, so the timed steps don't include the
+imports and the start of the background workers; its steps are reported as the profile
+"cold start".
+
+Every step is repeated and the report records the median, 95th percentile and maximum
+duration in seconds.  The report is written as JSON; a step fails its threshold when
+its median is above the limit in the thresholds file (the first matching pattern,
+matched with fnmatch against "<step>" and "<profile>/<step>"), or when it is more than
+``--max-regression`` times (and ``--regression-slack`` seconds) slower than in a
+baseline report.  The exit status is 1
+when some step fails.
+
+Usage (from the repository root)::
+
+    python benchmarks/rerun_latency.py --output report.json
+    python benchmarks/rerun_latency.py --grid 3x5,7x15 --large-grid 20x3000 --repeats 3
+    python benchmarks/rerun_latency.py --baseline previous_report.json --max-regression 1.5
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(REPO_DIR, "vm-tutorial.py")
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+
+DEFAULT_GRID = "3x5,5x11,7x15"
+DEFAULT_LARGE_GRID = "10x1000,20x5000"
+
+
+def parse_grid(grid):
+    """Parse "3x5,7x15" into [(3, 5), (7, 15)]."""
+    if not grid:
+        return list()
+    return [tuple(int(n) for n in point.split("x")) for point in grid.split(",")]
+
+
+def timed_run(at):
+    """Rerun the app, returning the duration in seconds."""
+    start = time.perf_counter()
+    at.run()
+    duration = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError("; ".join(e.value for e in at.exception))
+    return duration
+
+
+def new_session(timeout):
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    return at, timed_run(at)
+
+
+def generate_profile(at, num_cands=None, num_voters=None, fixed_profile="", large_election=False):
+    """Fill in the sidebar form and submit it, returning the duration of the submit rerun."""
+    if at.sidebar.toggle[0].value != large_election:
+        at.sidebar.toggle[0].set_value(large_election)
+        timed_run(at)
+    if num_cands is not None:
+        at.sidebar.slider[0].set_value(num_cands)
+    if num_voters is not None:
+        voters = at.sidebar.number_input[0] if large_election else at.sidebar.slider[1]
+        voters.set_value(num_voters)
+    at.sidebar.selectbox[0].select(fixed_profile)
+    at.sidebar.button[0].click()
+    return timed_run(at)
+
+
+def profile_steps(at):
+    """Time the interactions with the current profile, as a list of (step, duration)."""
+    durations = list()
+
+    pair = [s for s in at.selectbox if "head-to-head" in str(s.label)][0]
+    if len(pair.options) > 1:
+        pair.select_index(1)
+        durations.append(("margin_pair", timed_run(at)))
+
+    for idx in range(len(at.multiselect)):
+        multiselect = at.multiselect[idx]
+        method = str(multiselect.label).replace("Which candidates are the ", "").replace(" winners?", "")
+        multiselect.set_value([multiselect.options[0]])
+        durations.append((f"answer:{method}", timed_run(at)))
+        button = [b for b in at.button if b.label == f"Check {method} winners"][0]
+        button.click()
+        durations.append((f"check:{method}", timed_run(at)))
+    return durations
+
+
+def cold_start(timeout):
+    """Run a first session and check every method of its profile, returning the (step, duration) of its reruns."""
+    at, duration = new_session(timeout)
+    return [("initial_load", duration)] + profile_steps(at)
+
+
+def summarize(durations):
+    durations = np.array(durations)
+    return {
+        "n": int(len(durations)),
+        "median_s": float(np.median(durations)),
+        "p95_s": float(np.percentile(durations, 95)),
+        "max_s": float(durations.max()),
+    }
+
+
+def run_benchmarks(grid, large_grid, fixed, repeats, timeout, log=print):
+    """Run the benchmark, returning a dictionary from (profile, step) to the list of durations."""
+    samples = dict()
+
+    def record(profile, step, duration):
+        samples.setdefault((profile, step), list()).append(duration)
+        log(f"{profile:32} {step:40} {duration:8.3f}s")
+
+    # the imports and the start of the background workers are only timed once
+    for step, duration in cold_start(timeout):
+        record("cold start", step, duration)
+
+    for _ in range(repeats):
+        at, duration = new_session(timeout)
+        record("-", "initial_load", duration)
+
+        if fixed:
+            fixed_profiles = [name for name in at.sidebar.selectbox[0].options if name != ""]
+        else:
+            fixed_profiles = list()
+
+        profiles = [(f"random {c}x{v}", dict(num_cands=c, num_voters=v)) for c, v in grid]
+        profiles += [(f"large {c}x{v}", dict(num_cands=c, num_voters=v, large_election=True)) for c, v in large_grid]
+        profiles += [(name, dict(fixed_profile=name)) for name in fixed_profiles]
+
+        for profile, settings in profiles:
+            record(profile, "generate_profile", generate_profile(at, **settings))
+            for step, duration in profile_steps(at):
+                record(profile, step, duration)
+    return samples
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    versions = dict()
+    for package in ("streamlit", "pref_voting", "numpy", "networkx"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": versions,
+        "git_commit": git_commit(),
+    }
+
+
+def check_thresholds(results, thresholds, baseline=None, max_regression=None, regression_slack=0.0):
+    """Mark each result that is too slow with the reasons, returning the number of failures."""
+    baseline_medians = dict()
+    if baseline is not None:
+        baseline_medians = {(r["profile"], r["step"]): r["median_s"] for r in baseline["results"]}
+    failures = 0
+    for result in results:
+        reasons = list()
+        for pattern, limit in thresholds.items():
+            if fnmatch.fnmatch(result["step"], pattern) or fnmatch.fnmatch(f"{result['profile']}/{result['step']}", pattern):
+                result["threshold_s"] = limit
+                if result["median_s"] > limit:
+                    reasons.append(f"median {result['median_s']:.3f}s above the threshold {limit:.3f}s ({pattern})")
+                break
+        previous = baseline_medians.get((result["profile"], result["step"]))
+        if previous is not None and max_regression is not None:
+            result["baseline_median_s"] = previous
+            if result["median_s"] > max_regression * previous and result["median_s"] - previous > regression_slack:
+                reasons.append(f"median {result['median_s']:.3f}s more than {max_regression}x the baseline {previous:.3f}s")
+        result["ok"] = len(reasons) == 0
+        if reasons:
+            result["failures"] = reasons
+            failures += 1
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--grid", default=DEFAULT_GRID, help="random profiles as <candidates>x<voters>, comma separated (default %(default)s)")
+    parser.add_argument("--large-grid", default=DEFAULT_LARGE_GRID, help="random profiles in the large election mode (default %(default)s, empty to skip)")
+    parser.add_argument("--no-fixed", action="store_true", help="skip the fixed profiles")
+    parser.add_argument("--repeats", type=int, default=3, help="number of times each step is timed (default %(default)s)")
+    parser.add_argument("--timeout", type=float, default=300, help="timeout of a single rerun in seconds (default %(default)s)")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS, help="JSON file mapping step patterns to the maximum median in seconds")
+    parser.add_argument("--baseline", help="a previous report to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.5, help="maximum ratio of a median to its baseline median (default %(default)s)")
+    parser.add_argument("--regression-slack", type=float, default=0.1, help="slowdowns of at most this many seconds are not regressions (default %(default)s)")
+    parser.add_argument("--output", help="where to write the JSON report (default: standard output)")
+    parser.add_argument("--quiet", action="store_true", help="do not print each timing")
+    args = parser.parse_args(argv)
+
+    log = (lambda msg: None) if args.quiet else (lambda msg: print(msg, file=sys.stderr))
+    started = datetime.now(timezone.utc)
+    samples = run_benchmarks(parse_grid(args.grid), parse_grid(args.large_grid), not args.no_fixed, args.repeats, args.timeout, log=log)
+    results = [dict(profile=profile, step=step, **summarize(durations)) for (profile, step), durations in samples.items()]
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check_thresholds(results, thresholds, baseline=baseline, max_regression=args.max_regression, regression_slack=args.regression_slack)
+
+    report = {
+        "started": started.isoformat(),
+        "duration_s": (datetime.now(timezone.utc) - started).total_seconds(),
+        "environment": environment(),
+        "settings": {
+            "grid": args.grid, "large_grid": args.large_grid, "fixed_profiles": not args.no_fixed,
+            "repeats": args.repeats, "baseline": args.baseline, "max_regression": args.max_regression,
+            "regression_slack": args.regression_slack,
+        },
+        "failures": failures,
+        "results": results,
+    }
+    output = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    for result in results:
+        for reason in result.get("failures", list()):
+            log(f"FAIL {result['profile']}/{result['step']}: {reason}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
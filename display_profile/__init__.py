@@ -1,4 +1,6 @@
 import os
+
+import numpy as np
 import streamlit.components.v1 as components
 
 num_voters = 3
@@ -53,7 +55,8 @@ def display_profile(prof, rank_sizes, num_cands, cand_names, c1=None, c2=None, m
     Parameters
     ----------
     prof: 2d array of integers
-        The profile: an array where each component is a ranking of the candidates.
+        The profile: an array where each component is a ranking of the candidates
+        (a NumPy array or nested lists).
     rank_sizes: array of integers
         array of the number of voters with each ranking
     num_cands: integer
@@ -71,13 +74,22 @@ def display_profile(prof, rank_sizes, num_cands, cand_names, c1=None, c2=None, m
     -------
     none
     """
+    # The arguments are sent as JSON, so arrays are converted to lists in one call
+    # (rather than ranking by ranking) and NumPy integers to ints.
+    prof = np.asarray(prof).tolist()
+    rank_sizes = np.asarray(rank_sizes).tolist()
+    if margin_matrix is not None:
+        margin_matrix = np.asarray(margin_matrix).tolist()
+    c1 = None if c1 is None else int(c1)
+    c2 = None if c2 is None else int(c2)
+
     # Call through to our private component function. Arguments we pass here
     # will be sent to the frontend, where they'll be available in an "args"
     # dictionary.
     #
     # "default" is a special argument that specifies the initial return
     # value of the component before the user has interacted with it.
-    component_value = _component_func(prof=prof, rank_sizes=rank_sizes, num_cands=num_cands, cand_names=cand_names, c1=c1, c2=c2, margin_matrix=margin_matrix, key=key)
+    component_value = _component_func(prof=prof, rank_sizes=rank_sizes, num_cands=int(num_cands), cand_names=list(cand_names), c1=c1, c2=c2, margin_matrix=margin_matrix, key=key)
 
     # We could modify the value returned from the component if we wanted.
     # There's no need to do this in our simple example - but it's an option.
@@ -0,0 +1,65 @@
+import time
+
+import streamlit as st
+
+from profile_analysis import voting_methods
+from profile_analysis.simulation import MAX_APP_WORKERS, SimulationSlot, batch_winners, simulate
+
+st.title("How often?")
+
+st.write("""How often is there no Condorcet winner?  How often do Instant Runoff Voting and Borda select different winners?  This page generates many random profiles (each voter's ranking is drawn uniformly at random, as in the tutorial) and estimates how often these things happen.  The estimates are updated as the profiles are generated, and a setting stops once every estimate is within the chosen margin (with 95% confidence).""")
+
+with st.form("simulation"):
+    num_cands = st.slider("Numbers of candidates", min_value=2, max_value=10, value=(3, 5))
+    voter_counts = st.multiselect("Numbers of voters", list(range(1, 102)), [5, 11, 51])
+    methods = st.multiselect(
+        "Voting methods",
+        list(voting_methods),
+        [vm_name for vm_name in voting_methods if vm_name in batch_winners],
+        help=f"{', '.join(vm_name for vm_name in voting_methods if vm_name not in batch_winners)} are computed one profile at a time, which is much slower.")
+    max_profiles = st.select_slider("Largest number of profiles for each setting", [1000, 10000, 100000], value=100000)
+    tolerance = st.select_slider("Stop when every estimate is within", [0.02, 0.01, 0.005, 0.002, 0.001], value=0.005, format_func=lambda t: f"±{t:.1%}")
+    workers = st.number_input("Worker processes", min_value=1, max_value=MAX_APP_WORKERS, value=MAX_APP_WORKERS)
+    run = st.form_submit_button("Run simulation")
+
+def show_tally(container, tally, max_profiles, seconds=None):
+    with container.container():
+        st.subheader(f"{tally.num_cands} candidates, {tally.num_voters} voters")
+        st.progress(min(1.0, tally.profiles / max_profiles))
+        caption = f"{tally.profiles:,} profiles, every estimate within ±{tally.half_width():.2%}"
+        if seconds:
+            caption += f" ({tally.profiles / seconds:,.0f} profiles per second)"
+        st.caption(caption)
+        st.dataframe(
+            [{"Statistic": row["statistic"], "Frequency": row["frequency"],
+              "95% interval": "" if row["frequency"] is None else f"{row['low']:.1%} – {row['high']:.1%}",
+              "Out of": row["profiles"]} for row in tally.rows()],
+            column_config={"Frequency": st.column_config.NumberColumn(format="percent")},
+            hide_index=True)
+
+if run:
+    settings = [(c, v) for c in range(num_cands[0], num_cands[1] + 1) for v in sorted(voter_counts)]
+    containers, tallies = dict(), dict()
+    start = previous = time.perf_counter()
+    st.session_state["simulation_results"] = (tallies, max_profiles)
+    if not settings:
+        st.warning("Choose some numbers of voters.")
+    # the simulations run in the server's processes, so only a few run at a time, whichever sessions start them
+    with SimulationSlot() as free:
+        if not free:
+            st.warning("Another simulation is running on the server.  Please try again in a moment.")
+        else:
+            try:
+                for setting, tally in simulate(settings, methods, max_profiles=max_profiles, tolerance=tolerance, workers=min(workers, MAX_APP_WORKERS)):
+                    if setting not in containers:
+                        # a setting starts when the batches of the previous one are done
+                        containers[setting], start = st.empty(), previous
+                    tallies[setting] = tally
+                    show_tally(containers[setting], tally, max_profiles, time.perf_counter() - start)
+                    previous = time.perf_counter()
+            except ValueError as e:
+                st.error(str(e))
+elif "simulation_results" in st.session_state:
+    tallies, max_profiles = st.session_state["simulation_results"]
+    for tally in tallies.values():
+        show_tally(st.empty(), tally, max_profiles)
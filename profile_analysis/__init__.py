@@ -0,0 +1,7 @@
+from .analysis import ProfileAnalysis, analysis_cache, analysis_store, get_analysis, profile_cache, profile_fingerprint
+from .cache import AnalysisCache, SessionFootprints, cache_limits, deep_getsizeof, session_footprints
+from .cycles import CycleAnalysis
+from .methods import VotingMethod, voting_methods
+from .store import AnalysisStore
+from .compact import CompactProfile, generate_compact_profile, parse_profile_key, profile_key, ranking_types_by_count
+from .timing import current_run, finish_run, log_to_file, span, span_stats, start_run
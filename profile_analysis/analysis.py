@@ -0,0 +1,319 @@
+import hashlib
+import threading
+
+import numpy as np
+
+from .cache import AnalysisCache, cache_limits
+from .compact import CompactProfile
+from .cycles import CycleAnalysis, split_cycle_defeats, witness_cycle
+from .diagrams import generate_diagram
+from .elimination import coombs_rounds, instant_runoff_rounds
+from .explanations import generate_explanation
+from .methods import voting_methods
+from .startup import pref_voting_module
+from .store import AnalysisStore
+from .timing import span
+
+
+def _span_name(key):
+    """The name of the timing span of computing the memoized value ``key``, e.g., "analysis.winners:Borda"."""
+    if isinstance(key, tuple):
+        return f"analysis.{key[0]}:{key[1]}"
+    return f"analysis.{key}"
+
+
+def profile_fingerprint(prof):
+    """A canonical fingerprint of the anonymized profile.
+
+    Two profiles get the same fingerprint exactly when they have the same candidates and
+    the same number of voters submitting each ranking, no matter how the rankings are
+    ordered or grouped.
+    """
+    rankings, rcounts = prof.rankings_counts
+    ranking_types, inverse = np.unique(np.asarray(rankings), axis=0, return_inverse=True)
+    counts = np.bincount(inverse.ravel(), weights=rcounts, minlength=len(ranking_types))
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.int64(prof.num_cands).tobytes())
+    h.update(ranking_types.astype(np.int64).tobytes())
+    h.update(counts.astype(np.int64).tobytes())
+    return h.hexdigest()
+
+
+def support_matrix(rankings, rcounts):
+    """The support matrix of the anonymized profile given by ``rankings`` and ``rcounts``."""
+    rankings = np.asarray(rankings)
+    rcounts = np.asarray(rcounts, dtype=np.int64)
+    # positions[v, c] is the position of candidate c in the v-th ranking
+    positions = np.argsort(rankings, axis=1)
+    # one row at a time, so that memory stays linear in the number of ranking types
+    return np.array([rcounts @ (positions[:, [c]] < positions) for c in range(rankings.shape[1])], dtype=np.int64)
+
+
+def rank_counts(rankings, rcounts):
+    """Array whose ``c, l`` entry is the number of voters that rank ``c`` in position ``l`` (starting at 0)."""
+    rankings = np.asarray(rankings)
+    num_cands = rankings.shape[1]
+    counts = np.zeros((num_cands, num_cands), dtype=np.int64)
+    np.add.at(counts, (rankings, np.arange(num_cands)[np.newaxis, :]), np.asarray(rcounts, dtype=np.int64)[:, np.newaxis])
+    return counts
+
+
+class ProfileAnalysis:
+    """Lazily computed answers and explanation data for a single profile.
+
+    Nothing is computed when the analysis is created.  The winners of a voting method
+    (and the data used to explain them) are computed the first time they are asked for
+    and then memoized, so a rerun only pays for the method that is being inspected.
+    Analyses are shared between sessions (see :func:`get_analysis`), so the memo is
+    filled under a per-item lock: concurrent requests for the same item compute it once.
+
+    Parameters
+    ----------
+    prof: Profile or CompactProfile
+        The (anonymized) profile shown in the tutorial.  Scores and margins are computed
+        from its arrays; a ``Profile`` is only built when a method from pref_voting needs one.
+    store: AnalysisStore or None
+        a store that gets every value when it is computed
+    store_key: string
+        the key of the profile in ``store``
+    """
+
+    # the store is shared by every analysis, it is not part of the memory of one
+    unsized_attributes = ("store", "_locks", "_lock")
+
+    def __init__(self, prof, store=None, store_key=None):
+        self.prof = prof
+        self.store = store
+        self.store_key = store_key
+        self._memo = dict()
+        self._locks = dict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # the margin graph of pref_voting can't be pickled, it is rebuilt from the margins;
+        # the copy is not connected to the store
+        return {"prof": self.prof, "_memo": {key: value for key, value in self._memo.items() if key != "margin_graph"}}
+
+    def __setstate__(self, state):
+        self.__init__(state["prof"])
+        self._memo.update(state["_memo"])
+
+    def _memoized(self, key, compute):
+        if key in self._memo:
+            return self._memo[key]
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._memo:
+                with span(_span_name(key)):
+                    self._memo[key] = compute()
+                if self.store is not None:
+                    self.store.save(self.store_key, {key: self._memo[key]})
+        return self._memo[key]
+
+    def preload(self, values, store=False):
+        """Fill the memo with precomputed ``values`` (e.g., answers from an exercise bank), keyed as the memo.
+
+        With ``store`` the values are also written to the store, like computed values.
+        """
+        with self._lock:
+            for key, value in values.items():
+                self._memo.setdefault(key, value)
+        if store and self.store is not None:
+            self.store.save(self.store_key, values)
+        return self
+
+    def merge(self, other):
+        """Fill the memo with the values computed by ``other``, an analysis of the same profile (e.g., in a worker process)."""
+        return self.preload(other._memo, store=True)
+
+    @property
+    def size_version(self):
+        """A number that grows whenever the analysis does (a value is memoized, or a memoized value
+        such as the :class:`CycleAnalysis` grows), so a cache only measures the analysis again then."""
+        return len(self._memo) + sum(getattr(value, "size_version", 0) for value in list(self._memo.values()))
+
+    def memoized(self, key):
+        """The memoized value of ``key`` without computing it (None when it has not been computed)."""
+        return self._memo.get(key)
+
+    def compute_all(self):
+        """Compute the full analysis bundle: every answer and all explanation data."""
+        self.margin_matrix()
+        self.condorcet_winner()
+        self.condorcet_loser()
+        self.majority_winner()
+        self.cycle_analysis()
+        for vm_name, vm in voting_methods.items():
+            if vm.supports(self.prof.num_cands):
+                self.winners(vm_name)
+        self.plurality_scores()
+        self.borda_scores()
+        self.irv_rounds()
+        self.coombs_rounds()
+        self.split_cycle_witnesses()
+        return self
+
+    def support_matrix(self):
+        """Array whose ``c1, c2`` entry is the number of voters that rank ``c1`` above ``c2``."""
+        return self._memoized("support_matrix", lambda: support_matrix(*self.prof.rankings_counts))
+
+    def margin_matrix(self):
+        """Array whose ``c1, c2`` entry is the margin of ``c1`` over ``c2``."""
+        def compute():
+            support = self.support_matrix()
+            return support - support.T
+        return self._memoized("margin_matrix", compute)
+
+    def majority_matrix(self):
+        """Boolean array whose ``c1, c2`` entry is True when ``c1`` is majority preferred to ``c2``."""
+        return self._memoized("majority_matrix", lambda: self.margin_matrix() > 0)
+
+    def win_counts(self):
+        """For each candidate, the number of candidates it is majority preferred to."""
+        return self._memoized("win_counts", lambda: self.majority_matrix().sum(axis=1))
+
+    def loss_counts(self):
+        """For each candidate, the number of candidates that are majority preferred to it."""
+        return self._memoized("loss_counts", lambda: self.majority_matrix().sum(axis=0))
+
+    def max_losses(self):
+        """For each candidate, its largest head-to-head loss (0 if it has no losses)."""
+        return self._memoized("max_losses", lambda: self.margin_matrix().max(axis=0))
+
+    def condorcet_winner(self):
+        def compute():
+            cws = np.flatnonzero(self.win_counts() == self.prof.num_cands - 1)
+            return int(cws[0]) if len(cws) == 1 else None
+        return self._memoized("condorcet_winner", compute)
+
+    def condorcet_loser(self):
+        def compute():
+            cls = np.flatnonzero(self.loss_counts() == self.prof.num_cands - 1)
+            return int(cls[0]) if len(cls) == 1 else None
+        return self._memoized("condorcet_loser", compute)
+
+    def majority_winner(self):
+        """The absolute majority winner (as a list with at most one candidate)."""
+        def compute():
+            return [int(c) for c in np.flatnonzero(self.plurality_score_array() >= self.prof.num_voters // 2 + 1)]
+        return self._memoized("majority_winner", compute)
+
+    def profile(self):
+        """The profile as a pref_voting ``Profile``."""
+        if isinstance(self.prof, CompactProfile):
+            return self._memoized("profile", self.prof.to_profile)
+        return self.prof
+
+    def margin_graph(self):
+        """The margin graph as a pref_voting ``MarginGraph``, the input of the methods from pref_voting."""
+        def compute():
+            margins = self.margin_matrix()
+            edges = [(int(c1), int(c2), int(margins[c1, c2])) for c1, c2 in zip(*np.nonzero(margins > 0))]
+            return pref_voting_module("weighted_majority_graphs").MarginGraph(list(self.prof.candidates), edges)
+        return self._memoized("margin_graph", compute)
+
+    def winners(self, vm_name):
+        """The sorted list of winners of the voting method named ``vm_name``, see :class:`VotingMethod`."""
+        vm = voting_methods[vm_name]
+        if not vm.supports(self.prof.num_cands):
+            raise ValueError(f"{vm_name} winners are only computed for up to {vm.max_candidates} candidates")
+        return self._memoized(("winners", vm_name), lambda: vm.winners(*[getattr(self, name)() for name in vm.inputs]))
+
+    def rank_counts(self):
+        """Array whose ``c, l`` entry is the number of voters that rank ``c`` in position ``l`` (starting at 0)."""
+        return self._memoized("rank_counts", lambda: rank_counts(*self.prof.rankings_counts))
+
+    def borda_score_array(self):
+        def compute():
+            num_cands = self.prof.num_cands
+            return self.rank_counts() @ np.arange(num_cands - 1, -1, -1)
+        return self._memoized("borda_score_array", compute)
+
+    def plurality_score_array(self):
+        """Array of the number of voters that rank each candidate in first place."""
+        return self._memoized("plurality_score_array", lambda: self.rank_counts()[:, 0])
+
+    def plurality_scores(self):
+        """The Plurality score of each candidate, as a dictionary."""
+        return self._memoized("plurality_scores", lambda: {c: int(s) for c, s in enumerate(self.plurality_score_array())})
+
+    def borda_scores(self):
+        """The Borda score of each candidate, as a dictionary."""
+        return self._memoized("borda_scores", lambda: {c: int(s) for c, s in enumerate(self.borda_score_array())})
+
+    def irv_rounds(self):
+        """The winners and the rounds of Instant Runoff Voting, see :func:`run_elimination`."""
+        return self._memoized("irv_rounds", lambda: instant_runoff_rounds(*self.prof.rankings_counts))
+
+    def coombs_rounds(self):
+        """The winners and the rounds of Coombs, see :func:`run_elimination`."""
+        return self._memoized("coombs_rounds", lambda: coombs_rounds(*self.prof.rankings_counts))
+
+    def split_cycle_defeats(self):
+        """Boolean array whose ``c1, c2`` entry is True when ``c1`` defeats ``c2`` in Split Cycle, see :func:`split_cycle_defeats`."""
+        return self._memoized("split_cycle_defeats", lambda: split_cycle_defeats(self.margin_matrix()))
+
+    def split_cycle_witnesses(self):
+        """The wins that are not Split Cycle defeats, each with a cycle in which it has the smallest margin.
+
+        A dictionary from ``(c1, c2)`` (the win of ``c1`` over ``c2``) to the cycle, a list of
+        candidates starting with ``c1, c2`` (see :func:`witness_cycle`).
+        """
+        def compute():
+            margins = self.margin_matrix()
+            discarded = self.majority_matrix() & ~self.split_cycle_defeats()
+            return {(int(c1), int(c2)): witness_cycle(margins, c1, c2) for c1, c2 in zip(*np.nonzero(discarded))}
+        return self._memoized("split_cycle_witnesses", compute)
+
+    def cycle_analysis(self):
+        """The majority cycles of the profile, see :class:`CycleAnalysis`."""
+        return self._memoized("cycle_analysis", lambda: CycleAnalysis(self.majority_matrix()))
+
+    def diagram(self, kind, cmap, cycle=None):
+        """The DOT source and rendered SVG of a diagram, see :func:`generate_diagram`.
+
+        Diagrams are memoized per kind (and cycle), so identical graphs shown in several
+        tabs, or by several sessions, are only laid out once.
+        """
+        key = ("diagram", kind, None if cycle is None else tuple(int(c) for c in cycle), tuple(cmap.items()))
+        return self._memoized(key, lambda: generate_diagram(self, kind, cmap, cycle=cycle))
+
+    def explanation(self, kind, cmap, cycles=None):
+        """The markdown document explaining ``kind``, see :func:`generate_explanation`.
+
+        Explanations are memoized per kind (and page of cycles), so they are built once
+        per profile rather than on every rerun of every session.
+        """
+        key = ("explanation", kind, None if cycles is None else tuple(tuple(int(c) for c in cycle) for cycle in cycles), tuple(cmap.items()))
+        return self._memoized(key, lambda: generate_explanation(self, kind, cmap, cycles=cycles))
+
+
+analysis_cache = AnalysisCache(**cache_limits("analysis", max_entries=256, ttl=3600, max_mb=64))
+
+# the generated profiles, shared by the sessions that show the same profile
+profile_cache = AnalysisCache(**cache_limits("profile", max_entries=64, ttl=3600, max_mb=32))
+
+# the values computed by all of the app processes on this machine, when VM_TUTORIAL_ANALYSIS_STORE is set
+analysis_store = AnalysisStore.from_environment()
+
+
+def get_analysis(prof, pinned=False, precomputed=None, key=None):
+    """The shared analysis of ``prof``, looked up by its fingerprint in ``analysis_cache``.
+
+    Pinned analyses (used for the fixed example profiles) are never evicted, so they are
+    computed once per process.  A new analysis starts with the ``precomputed`` values
+    (see :meth:`ProfileAnalysis.preload`) and the values other processes stored in
+    ``analysis_store``.  A ``key`` that identifies the profile (e.g., the key of a
+    generated profile, see :func:`profile_key`) is used instead of the fingerprint, which
+    takes a while to compute for large profiles.
+    """
+    key = profile_fingerprint(prof) if key is None else key
+    def compute():
+        analysis = ProfileAnalysis(prof, store=analysis_store, store_key=key)
+        if precomputed is not None:
+            analysis.preload(precomputed)
+        if analysis_store is not None:
+            analysis.preload(analysis_store.load(key))
+        return analysis
+    return analysis_cache.get_or_compute(key, compute, pinned=pinned)
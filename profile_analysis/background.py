@@ -0,0 +1,182 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+
+from .analysis import ProfileAnalysis, profile_fingerprint
+from .startup import pref_voting_module, worker_safe_main
+
+
+# in a worker process, the queue on which it reports the tasks it starts
+_started = None
+
+
+def warm_worker(started):
+    # the workers import pref_voting when they start, not when the first task arrives
+    global _started
+    _started = started
+    pref_voting_module("margin_based_methods")
+
+
+def compute_items(task_id, prof, items):
+    """Compute ``items`` (names of methods of :class:`ProfileAnalysis` with their arguments) in a worker process.
+
+    Returns the analysis, so that every value computed on the way is sent back.
+    """
+    _started.put((task_id, time.time()))
+    analysis = ProfileAnalysis(prof)
+    for name, *args in items:
+        getattr(analysis, name)(*args)
+    return analysis
+
+
+class BackgroundTask:
+    def __init__(self, task_id, prof, items, result):
+        self.task_id = task_id
+        self.prof = prof
+        self.items = items
+        self.result = result
+        self.start = time.monotonic()
+        # set when a worker starts the task
+        self.deadline = None
+
+
+class BackgroundPool:
+    """A bounded pool of worker processes computing the expensive parts of analyses.
+
+    The script of a session submits the computation and polls for its status, so the
+    page is rendered (with a placeholder) while the workers compute.  The results are
+    merged into the analysis of the profile, so the computation runs once per profile,
+    whichever session asks for it.  A computation that takes longer than ``timeout``
+    seconds (from the moment a worker starts it) is stopped, and the profile is marked as
+    too large for it for ``failure_ttl`` seconds; errors are remembered as long.  Failures
+    are not stored in the analysis, so they are retried later.
+
+    Parameters
+    ----------
+    processes: integer
+        the number of worker processes, started by :meth:`start` or on the first submission
+    timeout: float
+        seconds a computation may take in a worker
+    failure_ttl: float
+        seconds a timeout or an error is reported before the computation is tried again
+    """
+
+    def __init__(self, processes=2, timeout=20, failure_ttl=300):
+        self.processes = processes
+        self.timeout = timeout
+        self.failure_ttl = failure_ttl
+        self._pool = None
+        self._started = None
+        self._tasks = dict()
+        self._failures = dict()
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _start_pool(self):
+        if self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            self._started = context.Queue()
+            with worker_safe_main():
+                self._pool = context.Pool(self.processes, initializer=warm_worker, initargs=(self._started,))
+
+    def start(self):
+        """Start the worker processes (which import pref_voting), so that the first computation doesn't wait for them."""
+        with self._lock:
+            self._start_pool()
+
+    def _submit(self, prof, items):
+        self._start_pool()
+        task_id = next(self._task_ids)
+        return BackgroundTask(task_id, prof, items, self._pool.apply_async(compute_items, (task_id, prof, items)))
+
+    def _update_deadlines(self):
+        # the deadline of a task is set when a worker reports that it started the task
+        tasks = {task.task_id: task for task in self._tasks.values()}
+        while True:
+            try:
+                task_id, started = self._started.get_nowait()
+            except queue.Empty:
+                return
+            if task_id in tasks:
+                tasks[task_id].deadline = time.monotonic() - max(0, time.time() - started) + self.timeout
+
+    def _restart(self):
+        # a worker can't be stopped in the middle of a task: the pool is replaced, and the
+        # other tasks start over in the new pool
+        self._pool.terminate()
+        self._pool = None
+        for key, task in self._tasks.items():
+            self._tasks[key] = self._submit(task.prof, task.items)
+
+    def status(self, analysis, items, wait=0):
+        """The status of the computation of ``items`` for ``analysis``, which is submitted if needed.
+
+        Parameters
+        ----------
+        analysis: ProfileAnalysis
+            the analysis that gets the computed values
+        items: list of tuples
+            the names of the methods of the analysis to compute, each followed by its arguments
+        wait: float
+            the largest number of seconds to wait for the computation
+
+        Returns
+        -------
+        A pair ``(status, detail)``: ("done", None), ("pending", seconds since it was
+        submitted), ("too large", timeout in seconds) or ("error", message).
+        """
+        items = tuple(tuple(item) for item in items)
+        memo_key = ("background", items)
+        profile = analysis.store_key if analysis.store_key is not None else profile_fingerprint(analysis.prof)
+        key = (profile, items)
+        with self._lock:
+            if analysis.memoized(memo_key) is not None:
+                return analysis.memoized(memo_key)
+            failure = self._failures.get(key)
+            if failure is not None and failure[1] > time.monotonic():
+                return failure[0]
+            self._failures.pop(key, None)
+            if key not in self._tasks:
+                self._tasks[key] = self._submit(analysis.prof, items)
+            task = self._tasks[key]
+            self._update_deadlines()
+            deadline = task.deadline
+        task.result.wait(wait if deadline is None else max(0, min(wait, deadline - time.monotonic())))
+        with self._lock:
+            if self._tasks.get(key, task) is not task:
+                # the task started over in a new pool while waiting
+                task = self._tasks[key]
+            self._update_deadlines()
+            if task.result.ready():
+                try:
+                    analysis.merge(task.result.get())
+                    status = ("done", None)
+                except Exception as e:
+                    status = ("error", f"{type(e).__name__}: {e}")
+            elif task.deadline is not None and time.monotonic() >= task.deadline:
+                status = ("too large", self.timeout)
+            else:
+                return ("pending", time.monotonic() - task.start)
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+                if status[0] == "too large":
+                    self._restart()
+            if status[0] == "done":
+                analysis.preload({memo_key: status}, store=True)
+            else:
+                self._failures[key] = (status, time.monotonic() + self.failure_ttl)
+            return status
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+            self._tasks.clear()
+            self._failures.clear()
+
+
+# the pool shared by all sessions of the app
+background_pool = BackgroundPool()
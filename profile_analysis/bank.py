@@ -0,0 +1,292 @@
+import argparse
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .analysis import ProfileAnalysis
+from .compact import CompactProfile, generate_anonymized_profile, smallest_int_dtype
+from .methods import voting_methods
+
+BANK_MAGIC = b"VMBANK01"
+# arrays start at multiples of this many bytes in the file
+ALIGNMENT = 64
+
+# properties of a profile that make it a pedagogically interesting exercise
+FLAGS = {
+    "no_condorcet_winner": 1,
+    "methods_disagree": 2,
+    "irv_differs_from_plurality": 4,
+    "majority_cycle": 8,
+}
+
+
+def candidate_mask(cands):
+    """The set of candidates ``cands`` as a bit mask."""
+    return sum(1 << int(c) for c in cands)
+
+
+def mask_candidates(mask, num_cands):
+    """The sorted list of candidates in the bit mask ``mask``."""
+    return [c for c in range(num_cands) if int(mask) >> c & 1]
+
+
+def elimination_round(rounds, num_cands):
+    """For each candidate, the round in which it is eliminated (-1 for the winners)."""
+    eliminated = np.full(num_cands, -1, dtype=np.int8)
+    for r, elim_round in enumerate(rounds):
+        eliminated[list(elim_round["removed"])] = r
+    return eliminated
+
+
+def elimination_rounds(eliminated, winners):
+    """The rounds of an elimination (as in :func:`run_elimination`) from the round in which each
+    candidate is eliminated (see :func:`elimination_round`) and the ``winners``."""
+    eliminated = np.asarray(eliminated)
+    num_rounds = int(eliminated.max()) + 1
+    rounds = list()
+    for r in range(num_rounds):
+        remaining = (eliminated < 0) | (eliminated > r)
+        # the elimination stops at the first round with a majority winner, or with no candidates left
+        majority_winner = list(winners) if r == num_rounds - 1 and remaining.any() else list()
+        rounds.append({
+            "removed": [int(c) for c in np.flatnonzero(eliminated == r)],
+            "remaining": remaining,
+            "majority_winner": majority_winner,
+        })
+    return sorted(winners), rounds
+
+
+def max_ranking_types(num_cands, num_voters):
+    return min(num_voters, math.factorial(num_cands))
+
+
+def generate_exercises(num_cands, num_voters, seeds):
+    """Generate the profile of each seed (as in the tutorial) and precompute its answers.
+
+    This runs in the worker processes of :func:`build_bank`.  Returns a dictionary of
+    arrays with one row per seed.
+    """
+    num_profiles, num_types = len(seeds), max_ranking_types(num_cands, num_voters)
+    score_dtype = smallest_int_dtype(num_voters * num_cands)
+    arrays = {
+        "seed": np.asarray(seeds, dtype=np.uint32),
+        "num_types": np.zeros(num_profiles, dtype=np.uint16),
+        "rankings": np.zeros((num_profiles, num_types, num_cands), dtype=np.int8),
+        "rcounts": np.zeros((num_profiles, num_types), dtype=smallest_int_dtype(num_voters)),
+        "winners": np.zeros((num_profiles, len(voting_methods)), dtype=np.uint32),
+        "condorcet_winner": np.full(num_profiles, -1, dtype=np.int8),
+        "condorcet_loser": np.full(num_profiles, -1, dtype=np.int8),
+        "margins": np.zeros((num_profiles, num_cands, num_cands), dtype=score_dtype),
+        "plurality_scores": np.zeros((num_profiles, num_cands), dtype=score_dtype),
+        "borda_scores": np.zeros((num_profiles, num_cands), dtype=score_dtype),
+        "irv_eliminated": np.zeros((num_profiles, num_cands), dtype=np.int8),
+        "coombs_eliminated": np.zeros((num_profiles, num_cands), dtype=np.int8),
+        "flags": np.zeros(num_profiles, dtype=np.uint8),
+    }
+    for idx, seed in enumerate(seeds):
+        prof = generate_anonymized_profile(num_cands, num_voters, seed=int(seed))
+        rankings, rcounts = prof.rankings_counts
+        analysis = ProfileAnalysis(prof)
+
+        arrays["num_types"][idx] = len(rcounts)
+        arrays["rankings"][idx, :len(rcounts)] = rankings
+        arrays["rcounts"][idx, :len(rcounts)] = rcounts
+        # the winners of the methods that are not computed for this many candidates are left empty
+        winners = [analysis.winners(vm_name) if vm.supports(num_cands) else list() for vm_name, vm in voting_methods.items()]
+        arrays["winners"][idx] = [candidate_mask(ws) for ws in winners]
+        if analysis.condorcet_winner() is not None:
+            arrays["condorcet_winner"][idx] = analysis.condorcet_winner()
+        if analysis.condorcet_loser() is not None:
+            arrays["condorcet_loser"][idx] = analysis.condorcet_loser()
+        arrays["margins"][idx] = analysis.margin_matrix()
+        arrays["plurality_scores"][idx] = list(analysis.plurality_scores().values())
+        arrays["borda_scores"][idx] = list(analysis.borda_scores().values())
+        arrays["irv_eliminated"][idx] = elimination_round(analysis.irv_rounds()[1], num_cands)
+        arrays["coombs_eliminated"][idx] = elimination_round(analysis.coombs_rounds()[1], num_cands)
+
+        flags = 0
+        if analysis.condorcet_winner() is None:
+            flags |= FLAGS["no_condorcet_winner"]
+        if any(ws != winners[0] for ws in winners if ws):
+            flags |= FLAGS["methods_disagree"]
+        if analysis.winners("Instant Runoff Voting") != analysis.winners("Plurality"):
+            flags |= FLAGS["irv_differs_from_plurality"]
+        if analysis.cycle_analysis().has_cycles:
+            flags |= FLAGS["majority_cycle"]
+        arrays["flags"][idx] = flags
+    return arrays
+
+
+def write_bank(path, tables):
+    """Write the arrays of each (num_cands, num_voters) setting to the bank file ``path``.
+
+    The file starts with ``BANK_MAGIC``, the length of a JSON header and the header, which
+    gives the dtype, shape and offset of every array.  The file is written next to
+    ``path`` and then moved into place, so readers never see a partial bank.
+    """
+    header = {"version": 1, "methods": list(voting_methods), "flags": FLAGS, "settings": list()}
+    offset = 0
+    for (num_cands, num_voters), arrays in sorted(tables.items()):
+        layout = dict()
+        for name, array in arrays.items():
+            layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        header["settings"].append({"num_cands": num_cands, "num_voters": num_voters, "count": len(arrays["seed"]), "arrays": layout})
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(len(BANK_MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(BANK_MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for setting in header["settings"]:
+            arrays = tables[(setting["num_cands"], setting["num_voters"])]
+            for name, layout in setting["arrays"].items():
+                f.seek(data_start + layout["offset"])
+                f.write(np.ascontiguousarray(arrays[name]).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def build_bank(path, settings, count, seed=None, workers=None, chunk_size=250, log=None):
+    """Generate ``count`` profiles for each (num_cands, num_voters) in ``settings`` with a process pool and write the bank.
+
+    The profile seeds are drawn from ``seed``, so a bank can be rebuilt exactly.
+    """
+    tables = dict()
+    setting_seeds = np.random.SeedSequence(seed).spawn(len(settings))
+    with ProcessPoolExecutor(workers) as pool:
+        for (num_cands, num_voters), seed_seq in zip(settings, setting_seeds):
+            seeds = seed_seq.generate_state(count)
+            futures = [pool.submit(generate_exercises, num_cands, num_voters, seeds[start:start + chunk_size])
+                       for start in range(0, count, chunk_size)]
+            chunks = [future.result() for future in futures]
+            tables[(num_cands, num_voters)] = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+            if log is not None:
+                flags = tables[(num_cands, num_voters)]["flags"]
+                log(f"{num_cands} candidates, {num_voters} voters: {count} profiles, "
+                    + ", ".join(f"{name} {int(((flags & bit) != 0).sum())}" for name, bit in FLAGS.items()))
+    write_bank(path, tables)
+    return tables
+
+
+class ExerciseBank:
+    """A bank of random profiles with precomputed answers, read from a file built by :func:`build_bank`.
+
+    The file is memory-mapped: opening a bank only reads its header, and the processes
+    serving the tutorial share the pages of the file.
+
+    Parameters
+    ----------
+    path: string
+        the bank file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._data[:len(BANK_MAGIC)]) != BANK_MAGIC:
+            raise ValueError(f"{path} is not an exercise bank")
+        header_length = int(np.frombuffer(self._data[len(BANK_MAGIC):len(BANK_MAGIC) + 8], dtype=np.uint64)[0])
+        header_end = len(BANK_MAGIC) + 8 + header_length
+        header = json.loads(bytes(self._data[len(BANK_MAGIC) + 8:header_end]))
+        data_start = -(-header_end // ALIGNMENT) * ALIGNMENT
+        unknown = [vm_name for vm_name in header["methods"] if vm_name not in voting_methods]
+        if unknown:
+            raise ValueError(f"{path} was built for unknown voting methods {unknown}")
+
+        self.methods = header["methods"]
+        self.flags = header["flags"]
+        self._tables = dict()
+        for setting in header["settings"]:
+            self._tables[(setting["num_cands"], setting["num_voters"])] = {
+                name: np.ndarray(tuple(layout["shape"]), dtype=np.dtype(layout["dtype"]), buffer=self._data, offset=data_start + layout["offset"])
+                for name, layout in setting["arrays"].items()
+            }
+
+    @property
+    def settings(self):
+        """The (num_cands, num_voters) settings in the bank."""
+        return sorted(self._tables)
+
+    def __contains__(self, setting):
+        return tuple(setting) in self._tables
+
+    def matching(self, num_cands, num_voters, require=()):
+        """The indices of the profiles of the setting with all of the properties in ``require`` (names in ``FLAGS``)."""
+        flags = self._tables[(num_cands, num_voters)]["flags"]
+        mask = sum(self.flags[name] for name in require)
+        return np.flatnonzero((flags & mask) == mask)
+
+    def sample(self, num_cands, num_voters, require=(), rng=None):
+        """The index of a random profile with the properties in ``require``, or None if there is none."""
+        indices = self.matching(num_cands, num_voters, require)
+        if len(indices) == 0:
+            return None
+        rng = np.random.default_rng() if rng is None else rng
+        return int(rng.choice(indices))
+
+    def seed(self, num_cands, num_voters, index):
+        """The seed that generates the profile (with ``generate_profile``)."""
+        return int(self._tables[(num_cands, num_voters)]["seed"][index])
+
+    def index_of_seed(self, num_cands, num_voters, seed):
+        """The index of the profile generated with ``seed``, or None if it is not in the bank."""
+        indices = np.flatnonzero(self._tables[(num_cands, num_voters)]["seed"] == seed)
+        return int(indices[0]) if len(indices) > 0 else None
+
+    def profile(self, num_cands, num_voters, index):
+        table = self._tables[(num_cands, num_voters)]
+        num_types = table["num_types"][index]
+        return CompactProfile(table["rankings"][index, :num_types], table["rcounts"][index, :num_types], sort=False)
+
+    def answers(self, num_cands, num_voters, index):
+        """The precomputed answers of the profile, keyed as in the memo of :class:`ProfileAnalysis`."""
+        table = self._tables[(num_cands, num_voters)]
+        condorcet_winner, condorcet_loser = int(table["condorcet_winner"][index]), int(table["condorcet_loser"][index])
+        answers = {
+            "margin_matrix": table["margins"][index].astype(np.int64),
+            "condorcet_winner": None if condorcet_winner < 0 else condorcet_winner,
+            "condorcet_loser": None if condorcet_loser < 0 else condorcet_loser,
+            "plurality_scores": {c: int(s) for c, s in enumerate(table["plurality_scores"][index])},
+            "borda_scores": {c: int(s) for c, s in enumerate(table["borda_scores"][index])},
+        }
+        for vm_name, mask in zip(self.methods, table["winners"][index]):
+            if mask:
+                answers[("winners", vm_name)] = mask_candidates(mask, num_cands)
+        for vm_name, key, array in (("Instant Runoff Voting", "irv_rounds", "irv_eliminated"), ("Coombs", "coombs_rounds", "coombs_eliminated")):
+            if ("winners", vm_name) in answers:
+                answers[key] = elimination_rounds(table[array][index], answers[("winners", vm_name)])
+        return answers
+
+
+def parse_settings(settings):
+    """Parse "3x5,7x15" into [(3, 5), (7, 15)]; "3-4x5-6" is every setting in the ranges."""
+    parsed = list()
+    for point in settings.split(","):
+        cands, voters = (tuple(int(n) for n in part.split("-")) for part in point.split("x"))
+        parsed += [(c, v) for c in range(cands[0], cands[-1] + 1) for v in range(voters[0], voters[-1] + 1)]
+    return parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a bank of random profiles with precomputed answers for the tutorial.")
+    parser.add_argument("path", help="the bank file to write")
+    parser.add_argument("--settings", default="2-7x1-15", help="<candidates>x<voters> settings, comma separated, with ranges (default %(default)s)")
+    parser.add_argument("--count", type=int, default=1000, help="number of profiles for each setting (default %(default)s)")
+    parser.add_argument("--seed", type=int, help="seed of the bank, for reproducible builds")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: the number of CPUs)")
+    args = parser.parse_args(argv)
+
+    build_bank(args.path, parse_settings(args.settings), args.count, seed=args.seed, workers=args.workers,
+               log=lambda msg: print(msg, file=sys.stderr))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
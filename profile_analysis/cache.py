@@ -0,0 +1,238 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def deep_getsizeof(obj, seen=None):
+    """Approximate number of bytes used by ``obj`` and everything it refers to.
+
+    NumPy arrays are counted by their buffer size, containers and plain objects
+    are traversed recursively, and shared objects are only counted once.  The attributes
+    a class lists in ``unsized_attributes`` (e.g., a store shared by every instance, or
+    locks) are not counted.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) if obj.base is None else obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_getsizeof(k, seen) + deep_getsizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_getsizeof(x, seen) for x in obj)
+    if hasattr(obj, "__dict__"):
+        unsized = getattr(type(obj), "unsized_attributes", ())
+        size += sys.getsizeof(vars(obj))
+        size += sum(deep_getsizeof(k, seen) + deep_getsizeof(v, seen) for k, v in vars(obj).items() if k not in unsized)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "created", "nbytes", "size_version", "pinned")
+
+    def __init__(self, value, nbytes, size_version, pinned):
+        self.value = value
+        self.created = time.monotonic()
+        self.nbytes = nbytes
+        self.size_version = size_version
+        self.pinned = pinned
+
+
+class AnalysisCache:
+    """A thread-safe LRU cache bounded by number of entries, age and memory.
+
+    Entries older than ``ttl`` seconds are dropped when they are next looked up, and the
+    least recently used entries are evicted whenever there are more than ``max_entries``
+    entries or they use more than ``max_bytes`` bytes.  Pinned entries (e.g., the analyses
+    of the fixed example profiles) never expire and are never evicted.
+
+    Since cached values may fill themselves in lazily, a value can have a ``size_version``
+    attribute that changes when it grows (e.g., :attr:`ProfileAnalysis.size_version`); the
+    entry is measured again when it is looked up after its version changed.  Values without
+    one are only measured when they are cached.
+
+    Parameters
+    ----------
+    max_entries: integer
+        maximum number of unpinned entries
+    ttl: number or None
+        number of seconds an unpinned entry is kept (None means forever)
+    max_bytes: integer or None
+        maximum (approximate) number of bytes used by the unpinned entries
+    sizeof: function
+        function used to measure the size of a value
+    """
+
+    def __init__(self, max_entries=256, ttl=3600, max_bytes=64 * 1024 * 1024, sizeof=deep_getsizeof):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live_entry(key) is not None
+
+    @property
+    def nbytes(self):
+        return sum(e.nbytes for e in self._entries.values())
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and not entry.pinned and self.ttl is not None and time.monotonic() - entry.created > self.ttl:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            size_version = getattr(entry.value, "size_version", None)
+            if size_version != entry.size_version:
+                entry.nbytes, entry.size_version = self.sizeof(entry.value), size_version
+                self._evict()
+            return entry.value
+
+    def put(self, key, value, pinned=False):
+        with self._lock:
+            # the version is read first, so a value that grows while it is measured is measured again
+            size_version = getattr(value, "size_version", None)
+            self._entries[key] = _Entry(value, self.sizeof(value), size_version, pinned)
+            self._entries.move_to_end(key)
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute, pinned=False):
+        """Return the value cached under ``key``, calling ``compute()`` to create it if needed.
+
+        ``compute`` is called without holding the lock, so a slow computation does not block
+        other sessions; if two sessions race, the first value stored wins.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            with self._lock:
+                entry = self._live_entry(key)
+                if entry is None:
+                    self.put(key, value, pinned=pinned)
+                else:
+                    value = entry.value
+        if pinned:
+            with self._lock:
+                if key in self._entries:
+                    self._entries[key].pinned = True
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """The number of entries and bytes used by the cache, with its limits and counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pinned": sum(e.pinned for e in self._entries.values()),
+                "bytes": self.nbytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self):
+        unpinned = [k for k, e in self._entries.items() if not e.pinned]
+        num_bytes = sum(self._entries[k].nbytes for k in unpinned)
+        # never evict the most recently used entry, even if it is larger than max_bytes
+        while len(unpinned) > 1 and (
+            len(unpinned) > self.max_entries
+            or (self.max_bytes is not None and num_bytes > self.max_bytes)
+        ):
+            key = unpinned.pop(0)
+            num_bytes -= self._entries.pop(key).nbytes
+            self.evictions += 1
+
+
+def cache_limits(name, max_entries, ttl, max_mb):
+    """The limits of the cache ``name`` as keyword arguments of :class:`AnalysisCache`.
+
+    The defaults can be changed with the environment variables ``VM_TUTORIAL_<NAME>_CACHE_ENTRIES``,
+    ``VM_TUTORIAL_<NAME>_CACHE_TTL`` (in seconds) and ``VM_TUTORIAL_<NAME>_CACHE_MB``, where
+    0 means no limit on the age or the memory.
+    """
+    prefix = f"VM_TUTORIAL_{name.upper()}_CACHE"
+    max_entries = int(os.environ.get(f"{prefix}_ENTRIES", max_entries))
+    ttl = float(os.environ.get(f"{prefix}_TTL", 0 if ttl is None else ttl))
+    max_mb = float(os.environ.get(f"{prefix}_MB", 0 if max_mb is None else max_mb))
+    return {"max_entries": max_entries, "ttl": ttl or None, "max_bytes": int(max_mb * 1024 * 1024) or None}
+
+
+class SessionFootprints:
+    """The memory used by each session, as last reported by the session.
+
+    A session reports the size of its own state (without the objects it shares through
+    the caches) at the end of each rerun.  Sessions that have not reported for ``ttl``
+    seconds are forgotten, so closed sessions don't stay in the report.
+
+    Parameters
+    ----------
+    ttl: number
+        number of seconds a report is kept
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._reports = dict()
+        self._lock = threading.Lock()
+
+    def report(self, session_id, nbytes):
+        with self._lock:
+            self._reports[session_id] = (time.monotonic(), nbytes)
+            self._expire()
+
+    def _expire(self):
+        now = time.monotonic()
+        for session_id in [s for s, (reported, _) in self._reports.items() if now - reported > self.ttl]:
+            del self._reports[session_id]
+
+    def summary(self):
+        """The number of sessions, and the total, mean and largest number of bytes they use."""
+        with self._lock:
+            self._expire()
+            sizes = [nbytes for _, nbytes in self._reports.values()]
+        return {
+            "sessions": len(sizes),
+            "bytes": sum(sizes),
+            "mean_bytes": sum(sizes) / len(sizes) if sizes else 0,
+            "max_bytes": max(sizes, default=0),
+        }
+
+
+# the footprints of the sessions of the app
+session_footprints = SessionFootprints()
@@ -0,0 +1,116 @@
+import re
+
+import numpy as np
+from prefsampling.ordinal import impartial
+
+from .startup import pref_voting_module
+
+
+def smallest_int_dtype(max_value):
+    return np.int8 if max_value < 2**7 else np.int16 if max_value < 2**15 else np.int32 if max_value < 2**31 else np.int64
+
+
+class CompactProfile:
+    """An anonymized profile stored as two arrays: the distinct rankings and their counts.
+
+    Creating one is a single ``np.unique`` over the rankings, so it is cheap even with
+    thousands of voters.  It supports the parts of the ``Profile`` interface used by the
+    tutorial, and converts to a ``Profile`` (see :meth:`to_profile`) only when a voting
+    method from pref_voting needs one.
+
+    Parameters
+    ----------
+    rankings: 2d array of integers
+        the rankings of the candidates (one row per voter, or per ranking type if ``rcounts`` is given)
+    rcounts: array of integers or None
+        the number of voters with each ranking
+    sort: bool
+        if False, the ranking types are kept in the order they first appear (as in ``Profile.anonymize``)
+    """
+
+    def __init__(self, rankings, rcounts=None, sort=True):
+        rankings = np.asarray(rankings)
+        rcounts = np.ones(len(rankings), dtype=np.int64) if rcounts is None else np.asarray(rcounts)
+        ranking_types, first, inverse = np.unique(rankings, axis=0, return_index=True, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=rcounts, minlength=len(ranking_types)).astype(np.int64)
+        if not sort:
+            order = np.argsort(first)
+            ranking_types, counts = ranking_types[order], counts[order]
+
+        self.num_cands = ranking_types.shape[1]
+        self.candidates = list(range(self.num_cands))
+        self.num_voters = int(counts.sum())
+        self._rankings = ranking_types.astype(smallest_int_dtype(self.num_cands))
+        self._rcounts = counts.astype(smallest_int_dtype(counts.max()))
+
+    @property
+    def rankings_counts(self):
+        return self._rankings, self._rcounts
+
+    def strict_maj_size(self):
+        """The smallest number of voters that is a strict majority."""
+        return self.num_voters // 2 + 1
+
+    def to_profile(self):
+        Profile = pref_voting_module("profiles").Profile
+        return Profile(self._rankings.astype(int), rcounts=self._rcounts.astype(int))
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, CompactProfile)
+            and np.array_equal(self._rankings, other._rankings)
+            and np.array_equal(self._rcounts, other._rcounts)
+        )
+
+
+def random_rankings(num_cands, num_voters, seed=None):
+    """The rankings of a random profile, from the same model (impartial culture) and seed as
+    ``generate_profile`` in pref_voting, without importing pref_voting."""
+    return impartial(num_voters, num_cands, seed=seed)
+
+
+def generate_compact_profile(num_cands, num_voters, seed=None):
+    """A random profile (from the same model and seed as ``generate_profile``) as a :class:`CompactProfile`."""
+    return CompactProfile(random_rankings(num_cands, num_voters, seed=seed))
+
+
+def generate_anonymized_profile(num_cands, num_voters, seed=None):
+    """The profile ``generate_profile(num_cands, num_voters, seed=seed).anonymize()``, with the
+    same ranking types in the same order, as a :class:`CompactProfile`."""
+    return CompactProfile(random_rankings(num_cands, num_voters, seed=seed), sort=False)
+
+
+def profile_key(num_cands, num_voters, seed, large_election=False):
+    """The key of the random profile generated with ``seed``, short enough for a link.
+
+    For example, "5x11-1234" is the profile with 5 candidates and 11 voters generated with
+    the seed 1234, and "L30x1000-1234" is a large election (a :class:`CompactProfile`
+    sorted by ranking types, see :func:`generate_compact_profile`).
+    """
+    return f"{'L' if large_election else ''}{num_cands}x{num_voters}-{seed}"
+
+
+_PROFILE_KEY = re.compile(r"(L?)(\d+)x(\d+)-(\d+)")
+
+
+def parse_profile_key(key):
+    """The ``(num_cands, num_voters, seed, large_election)`` of a key made by :func:`profile_key`.
+
+    Raises ValueError if ``key`` is not such a key.
+    """
+    match = _PROFILE_KEY.fullmatch(key)
+    if match is None:
+        raise ValueError(f"Not a profile key: {key!r}")
+    large, num_cands, num_voters, seed = match.groups()
+    if int(seed) >= 2**32:
+        raise ValueError(f"The seed of a profile key must be less than 2**32: {key!r}")
+    return int(num_cands), int(num_voters), int(seed), bool(large)
+
+
+def ranking_types_by_count(rankings, rcounts, start=0, stop=None):
+    """The ranking types with the most voters first, restricted to the slice ``start:stop``.
+
+    Ties are broken by the order of the ranking types, so the order is stable across reruns.
+    """
+    order = np.argsort(-np.asarray(rcounts), kind="stable")[start:stop]
+    return np.asarray(rankings)[order], np.asarray(rcounts)[order]
@@ -0,0 +1,161 @@
+import threading
+
+import networkx as nx
+import numpy as np
+
+
+def transitive_closure(adjacency):
+    """Boolean array whose ``c1, c2`` entry is True when there is a path from ``c1`` to ``c2``."""
+    reach = np.array(adjacency, dtype=bool)
+    for k in range(reach.shape[0]):
+        reach |= reach[:, k, np.newaxis] & reach[np.newaxis, k, :]
+    return reach
+
+
+def widest_paths(weights):
+    """The strength of the strongest path between each pair of candidates.
+
+    ``weights`` has shape (..., num_cands, num_cands) (e.g., a batch of margin graphs), with
+    the margin of each head-to-head win and 0 for the other pairs; the strength of a path
+    is its smallest margin.
+    """
+    strength = np.array(weights)
+    for k in range(strength.shape[-1]):
+        strength = np.maximum(strength, np.minimum(strength[..., :, k, np.newaxis], strength[..., np.newaxis, k, :]))
+    return strength
+
+
+def split_cycle_defeats(margins):
+    """Boolean array whose ``c1, c2`` entry is True when ``c1`` defeats ``c2`` in Split Cycle.
+
+    A win is discarded when it has the smallest margin in some majority cycle, that is,
+    when there is a path back from the loser to the winner whose margins are all at least
+    the margin of the win.  So ``c1`` defeats ``c2`` when the margin of ``c1`` over ``c2``
+    is larger than the strength of the strongest path from ``c2`` to ``c1``, which takes
+    polynomial time, however many cycles there are.
+    """
+    margins = np.asarray(margins)
+    strength = widest_paths(np.where(margins > 0, margins, 0))
+    return (margins > 0) & (margins > np.swapaxes(strength, -1, -2))
+
+
+def witness_cycle(margins, c1, c2):
+    """A shortest majority cycle starting with the win of ``c1`` over ``c2`` in which that win has the smallest margin.
+
+    Returns None when there is no such cycle (the win is a Split Cycle defeat).
+    """
+    margins = np.asarray(margins)
+    # the path back from c2 to c1 only uses wins with at least the margin of c1 over c2
+    strong = margins >= margins[c1, c2]
+    previous, frontier = {c2: None}, [c2]
+    while frontier and c1 not in previous:
+        next_frontier = list()
+        for c in frontier:
+            for d in np.flatnonzero(strong[c]):
+                if int(d) not in previous:
+                    previous[int(d)] = c
+                    next_frontier.append(int(d))
+        frontier = next_frontier
+    if c1 not in previous:
+        return None
+    path = [previous[c1]]
+    while path[-1] != c2:
+        path.append(previous[path[-1]])
+    return [int(c1)] + path[::-1]
+
+
+class CycleAnalysis:
+    """Majority cycles of a profile, without enumerating every cycle up front.
+
+    Whether there are cycles, and which candidates are on some cycle, are read off the
+    strongly connected components of the majority graph: a candidate is on a cycle exactly
+    when it can reach itself.  Individual cycles are enumerated lazily (in the same order
+    as ``Profile.cycles``) and only as far as a caller asks for, so counting is capped and
+    the explanation can page through the cycles.
+
+    Parameters
+    ----------
+    majority: 2d array of booleans
+        the majority relation, see :meth:`ProfileAnalysis.majority_matrix`
+    """
+
+    def __init__(self, majority):
+        self.majority = np.asarray(majority, dtype=bool)
+        self.reach = transitive_closure(self.majority)
+        self._cycles = list()
+        self._cycle_iter = None
+        self._exhausted = False
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"majority": self.majority}
+
+    def __setstate__(self, state):
+        self.__init__(state["majority"])
+
+    @property
+    def size_version(self):
+        """The number of cycles listed so far, see :attr:`ProfileAnalysis.size_version`."""
+        return len(self._cycles)
+
+    @property
+    def has_cycles(self):
+        return bool(self.reach.diagonal().any())
+
+    @property
+    def cycle_candidates(self):
+        """The candidates that are on at least one majority cycle."""
+        return [int(c) for c in np.flatnonzero(self.reach.diagonal())]
+
+    def components(self):
+        """The strongly connected components with at least two candidates.
+
+        Every majority cycle is contained in exactly one of them.
+        """
+        mutual = self.reach & self.reach.T
+        components, seen = list(), set()
+        for c in self.cycle_candidates:
+            if c not in seen:
+                component = [int(d) for d in np.flatnonzero(mutual[c])]
+                seen.update(component)
+                components.append(component)
+        return components
+
+    def _enumerate_until(self, num_cycles):
+        with self._lock:
+            if self._cycle_iter is None and not self._exhausted:
+                mg = nx.DiGraph()
+                mg.add_nodes_from(range(self.majority.shape[0]))
+                # only the edges inside a strongly connected component can be on a cycle
+                on_cycle = self.majority & self.reach.T
+                mg.add_edges_from((int(c1), int(c2)) for c1, c2 in zip(*np.nonzero(on_cycle)))
+                self._cycle_iter = nx.simple_cycles(mg)
+            while not self._exhausted and len(self._cycles) < num_cycles:
+                try:
+                    self._cycles.append(next(self._cycle_iter))
+                except StopIteration:
+                    self._exhausted = True
+                    self._cycle_iter = None
+
+    def cycles(self, limit):
+        """The first ``limit`` majority cycles."""
+        self._enumerate_until(limit)
+        return self._cycles[:limit]
+
+    def count(self, cap):
+        """The number of majority cycles, counting at most ``cap`` of them.
+
+        Returns
+        -------
+        (integer, boolean)
+            the number of cycles found and whether that is the exact number of cycles
+        """
+        if not self.has_cycles:
+            return 0, True
+        self._enumerate_until(cap + 1)
+        return min(len(self._cycles), cap), len(self._cycles) <= cap
+
+    def page(self, page_num, page_size):
+        """The cycles on page ``page_num`` (starting at 0) when showing ``page_size`` cycles per page."""
+        self._enumerate_until((page_num + 1) * page_size)
+        return self._cycles[page_num * page_size:(page_num + 1) * page_size]
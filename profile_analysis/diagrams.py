@@ -0,0 +1,75 @@
+import shutil
+import subprocess
+
+import numpy as np
+
+from .timing import span
+
+# server-side rendering needs the Graphviz binaries (see packages.txt)
+GRAPHVIZ_DOT = shutil.which("dot")
+
+
+def dot_string(nodes, edges):
+    node_strings ="\n".join([f'{n}[ label = "{n}" ];' for n in nodes])
+    edge_strings = "\n".join([f'{e[0]} -> {e[1]}[label="{e[2]}",weight="{e[2]}"];' if len(e) == 3 else f'{e[0]} -> {e[1]};' for e in edges])
+    return '''digraph { \n layout="circo";\n''' + node_strings + "\n" + edge_strings + "}"
+
+
+def generate_mg_dot(analysis, cmap):
+    margins = analysis.margin_matrix()
+    nodes = [cmap[_c] for _c in analysis.prof.candidates]
+    edges = [(cmap[c1], cmap[c2], margins[c1, c2]) for c1, c2 in zip(*np.nonzero(analysis.majority_matrix()))]
+    return dot_string(nodes, edges)
+
+
+def cycle_margins(cycle, analysis):
+    """The margins along the cycle, including the edge from the last candidate back to the first."""
+    return analysis.margin_matrix()[list(cycle), np.roll(cycle, -1)]
+
+
+def generate_cycle_dot(cycle, analysis, cmap):
+    nodes = [cmap[_c] for _c in cycle]
+    edges = [(cmap[c1], cmap[c2], m) for c1, c2, m in zip(cycle, np.roll(cycle, -1), cycle_margins(cycle, analysis))]
+    return dot_string(nodes, edges)
+
+
+def generate_sc_defeat_dot(analysis, cmap):
+    nodes = [cmap[_c] for _c in analysis.prof.candidates]
+    edges = [(cmap[c1], cmap[c2]) for c1, c2 in zip(*np.nonzero(analysis.split_cycle_defeats()))]
+    return dot_string(nodes, edges)
+
+
+def render_svg(dot, timeout=10):
+    """Lay out ``dot`` with Graphviz and return the SVG, or None if Graphviz is not available."""
+    if GRAPHVIZ_DOT is None:
+        return None
+    try:
+        with span("graphviz.render"):
+            return subprocess.run([GRAPHVIZ_DOT, "-Tsvg"], input=dot, capture_output=True, text=True, timeout=timeout, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def generate_diagram(analysis, kind, cmap, cycle=None):
+    """The DOT source and the rendered SVG (None if it can't be rendered) of a diagram.
+
+    Parameters
+    ----------
+    analysis: ProfileAnalysis
+        the analysis of the profile
+    kind: string
+        one of "margin_graph", "cycle" or "split_cycle_defeat"
+    cmap: dict
+        names of the candidates
+    cycle: list of integers
+        the cycle to draw when ``kind`` is "cycle"
+    """
+    if kind == "margin_graph":
+        dot = generate_mg_dot(analysis, cmap)
+    elif kind == "cycle":
+        dot = generate_cycle_dot(cycle, analysis, cmap)
+    elif kind == "split_cycle_defeat":
+        dot = generate_sc_defeat_dot(analysis, cmap)
+    else:
+        raise ValueError(f"Unknown diagram kind {kind!r}")
+    return dot, render_svg(dot)
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class EliminationEngine:
+    """Running first- and last-place tallies of a profile as candidates are eliminated.
+
+    For every ranking the engine keeps a pointer to its highest and lowest ranked remaining
+    candidate.  Removing candidates only moves the pointers of the rankings whose top (or
+    bottom) candidate was removed, and updates the tallies for those rankings, so running a
+    whole elimination costs about one pass over the rankings in total.
+
+    Parameters
+    ----------
+    rankings: 2d array of integers
+        the ranking types of an anonymized profile
+    rcounts: array of integers
+        the number of voters with each ranking
+    """
+
+    def __init__(self, rankings, rcounts):
+        self.rankings = np.asarray(rankings)
+        self.rcounts = np.asarray(rcounts, dtype=np.int64)
+        num_types, self.num_cands = self.rankings.shape
+        self.num_voters = int(self.rcounts.sum())
+        self.remaining = np.ones(self.num_cands, dtype=bool)
+        self._top = np.zeros(num_types, dtype=np.intp)
+        self._bottom = np.full(num_types, self.num_cands - 1, dtype=np.intp)
+        self.first_place = np.bincount(self.rankings[:, 0], weights=self.rcounts, minlength=self.num_cands).astype(np.int64)
+        self.last_place = np.bincount(self.rankings[:, -1], weights=self.rcounts, minlength=self.num_cands).astype(np.int64)
+
+    @property
+    def remaining_candidates(self):
+        return [int(c) for c in np.flatnonzero(self.remaining)]
+
+    def remove(self, cands):
+        """Eliminate the candidates ``cands`` and update the tallies."""
+        self.remaining[list(cands)] = False
+        if not self.remaining.any():
+            self.first_place[:] = 0
+            self.last_place[:] = 0
+            return
+        self._advance(self._top, 1, self.first_place)
+        self._advance(self._bottom, -1, self.last_place)
+
+    def _advance(self, pointer, step, tally):
+        rows = np.flatnonzero(~self.remaining[self.rankings[np.arange(len(pointer)), pointer]])
+        np.subtract.at(tally, self.rankings[rows, pointer[rows]], self.rcounts[rows])
+        moving = rows
+        while len(moving) > 0:
+            pointer[moving] += step
+            moving = moving[~self.remaining[self.rankings[moving, pointer[moving]]]]
+        np.add.at(tally, self.rankings[rows, pointer[rows]], self.rcounts[rows])
+
+    def majority_winner(self):
+        """The remaining candidate ranked first by a strict majority of voters (as a list with at most one candidate)."""
+        return [int(c) for c in np.flatnonzero(self.remaining & (self.first_place >= self.num_voters // 2 + 1))]
+
+    def ballot_view(self):
+        """The rankings restricted to the remaining candidates (one row for each ranking type)."""
+        return ballot_view(self.rankings, self.remaining)
+
+
+def ballot_view(rankings, remaining):
+    """The ``rankings`` restricted to the candidates in the boolean mask ``remaining`` (one row for each ranking)."""
+    rankings = np.asarray(rankings)
+    return rankings[remaining[rankings]].reshape(len(rankings), int(remaining.sum()))
+
+
+def _lowest_first_place(engine):
+    scores = np.where(engine.remaining, engine.first_place, np.iinfo(np.int64).max)
+    return [int(c) for c in np.flatnonzero(engine.remaining & (scores == scores.min()))]
+
+
+def _greatest_last_place(engine):
+    scores = np.where(engine.remaining, engine.last_place, -1)
+    return [int(c) for c in np.flatnonzero(engine.remaining & (scores == scores.max()))]
+
+
+def run_elimination(rankings, rcounts, select):
+    """Iteratively remove the candidates chosen by ``select`` until there is a majority winner.
+
+    If every remaining candidate is removed in the same round, they are all winners.
+
+    Returns
+    -------
+    (list, list)
+        the sorted winners, and for each round a dictionary with the candidates ``removed``
+        in that round, the boolean mask of the ``remaining`` candidates and the
+        ``majority_winner``.  The rounds are kept with the analysis, so they don't copy the
+        reduced profiles: the profile of a round is ``ballot_view(rankings, remaining)``.
+    """
+    engine = EliminationEngine(rankings, rcounts)
+    winners = engine.majority_winner()
+    rounds = list()
+    while len(winners) == 0:
+        removed = select(engine)
+        engine.remove(removed)
+        remaining = engine.remaining_candidates
+        if len(remaining) == 0:
+            winners = removed
+        elif len(remaining) == 1:
+            winners = remaining
+        else:
+            winners = engine.majority_winner()
+        rounds.append({
+            "removed": removed,
+            "remaining": engine.remaining.copy(),
+            "majority_winner": engine.majority_winner(),
+        })
+    return sorted(winners), rounds
+
+
+def instant_runoff_rounds(rankings, rcounts):
+    """Instant Runoff Voting: repeatedly remove the candidates with the fewest first-place votes."""
+    return run_elimination(rankings, rcounts, _lowest_first_place)
+
+
+def coombs_rounds(rankings, rcounts):
+    """Coombs: repeatedly remove the candidates with the most last-place votes."""
+    return run_elimination(rankings, rcounts, _greatest_last_place)
@@ -0,0 +1,149 @@
+import numpy as np
+
+
+def cand_list_str(cs, cmap):
+    return ", ".join([cmap[c] for c in cs])
+
+
+def bullets(items):
+    # consecutive items form one (tight) list in the document
+    return "\n".join(f"* {item}" for item in items)
+
+
+def document(*blocks):
+    """Join the paragraphs and lists of an explanation into one markdown document."""
+    return "\n\n".join(b for b in blocks if b)
+
+
+def majority_preferred_str(margins, c1, c2, cmap, preferred=True):
+    return f"Since $Margin({cmap[c1]}, {cmap[c2]}) = {margins[c1, c2]}$, ${cmap[c1]}$ is {'' if preferred else 'not '}majority preferred to ${cmap[c2]}$"
+
+
+def condorcet_winner_explanation(analysis, cmap):
+    margins, majority = analysis.margin_matrix(), analysis.majority_matrix()
+    condorcet_winner = analysis.condorcet_winner()
+    blocks = ["The **Condorcet winner** is the candidate that is majority preferred to every other candidate."]
+    if condorcet_winner is None:
+        for c1 in analysis.prof.candidates:
+            blocks.append(f"${cmap[c1]}$ is not the Condorcet winner:")
+            blocks.append(bullets([majority_preferred_str(margins, c1, c2, cmap, preferred=False)
+                                   for c2 in np.flatnonzero(~majority[c1]) if c1 != c2]))
+    else:
+        blocks.append(bullets([majority_preferred_str(margins, condorcet_winner, c, cmap)
+                               for c in analysis.prof.candidates if c != condorcet_winner]))
+    return document(*blocks)
+
+
+def condorcet_loser_explanation(analysis, cmap):
+    margins, majority = analysis.margin_matrix(), analysis.majority_matrix()
+    condorcet_loser = analysis.condorcet_loser()
+    blocks = ["The **Condorcet loser** is the candidate such that every other candidate is majority preferred to that candidate."]
+    if condorcet_loser is None:
+        for c1 in analysis.prof.candidates:
+            blocks.append(f"${cmap[c1]}$ is not the Condorcet loser:")
+            blocks.append(bullets([majority_preferred_str(margins, c2, c1, cmap, preferred=False)
+                                   for c2 in np.flatnonzero(~majority[:, c1]) if c1 != c2]))
+    else:
+        blocks.append(bullets([majority_preferred_str(margins, c, condorcet_loser, cmap)
+                               for c in analysis.prof.candidates if c != condorcet_loser]))
+    return document(*blocks)
+
+
+def cycles_explanation(analysis, cmap, cycles):
+    margins = analysis.margin_matrix()
+    blocks = list()
+    for cycle in cycles:
+        blocks.append(f"${', '.join([cmap[c] for c in cycle])}$ is a cycle:")
+        blocks.append(bullets([majority_preferred_str(margins, c1, c2, cmap) for c1, c2 in zip(cycle, np.roll(cycle, -1))]))
+    return document(*blocks)
+
+
+def plurality_explanation(analysis, cmap):
+    plscores = analysis.plurality_scores()
+    pl_ws = analysis.winners("Plurality")
+    return document(
+        "The **Plurality score** of a candidate $x$ is the number of voters that rank $x$ in first place.   The candidate(s) with the largest Plurality score is a Plurality winner.",
+        f"The largest Plurality score is {max(plscores.values())}",
+        bullets([f"The Plurality score of ${cmap[c]}$ is ${plscores[c]}$ " + ("(winner)" if c in pl_ws else "")
+                 for c in analysis.prof.candidates]))
+
+
+def borda_explanation(analysis, cmap):
+    scores = list(range(len(analysis.prof.candidates) - 1, -1, -1))
+    bscores = analysis.borda_scores()
+    borda_ws = analysis.winners("Borda")
+    rank_counts = analysis.rank_counts()
+    return document(
+        f"The **Borda score** for a candidate is determined as follows:  Each voter gives {scores[0]} points to the candidate ranked in first place, {scores[1]} points to the candidate ranked in 2nd place, $\\ldots$, and 0 points to the candidate ranked in last place.  The candidates overall Borda score is the sum of the Borda scores assigned from each voter.   The candidate(s) with the largest Borda score is a Borda winner.",
+        f"The largest Borda score is {max(bscores.values())}",
+        bullets([f"The Borda score of ${cmap[c]}$ is ${' + '.join([f'{x} * {y} ' for x, y in zip(scores, rank_counts[c])])} = {bscores[c]}$ " + ("(winner)" if c in borda_ws else "")
+                 for c in analysis.prof.candidates]))
+
+
+def minimax_explanation(analysis, cmap):
+    margins = analysis.margin_matrix()
+    minimax_ws = analysis.winners("Minimax")
+    minimax_data = analysis.max_losses()
+    items = list()
+    for c in analysis.prof.candidates:
+        if minimax_data[c] == 0:
+            items.append(f"{cmap[c]} has no head-to-head losses, so the maximum loss is 0.")
+        else:
+            items.append(f"The largest head-to-head loss for {cmap[c]} is {minimax_data[c]} (against {cand_list_str(np.flatnonzero(margins[:, c] == minimax_data[c]), cmap)})")
+    return document(
+        f"The Minimax winners: {cand_list_str(minimax_ws, cmap)}.",
+        f"The minimum minimax score (i.e., the largest head-to-head loss) for any candidate is {minimax_data.min()}",
+        bullets(items))
+
+
+def copeland_explanation(analysis, cmap):
+    majority = analysis.majority_matrix()
+    copeland_ws = analysis.winners("Copeland")
+    max_win_loss = (analysis.win_counts() - analysis.loss_counts()).max()
+    items = list()
+    for c in analysis.prof.candidates:
+        beats, loses_to = np.flatnonzero(majority[c]), np.flatnonzero(majority[:, c])
+        win_loss = len(beats) - len(loses_to)
+        items.append(f"""* The win-loss record for {cmap[c]} is calculated as follows:
+
+    Candidates that {cmap[c]} beats: {cand_list_str(beats, cmap) if len(beats) > 0 else 'none'}.
+
+    Candidates that {cmap[c]} loses to: {cand_list_str(loses_to, cmap) if len(loses_to) > 0 else 'none'}.
+
+    The win-loss record for {cmap[c]} is ${len(beats)} - {len(loses_to)} = {win_loss}$ {'(winner)' if win_loss == max_win_loss else ''}.""")
+    return document(
+        f"The Copeland winners: {cand_list_str(copeland_ws, cmap)}.",
+        f"The maximum win-loss record for any candidate is {max_win_loss}",
+        "\n\n".join(items))
+
+
+explanation_builders = {
+    "condorcet_winner": condorcet_winner_explanation,
+    "condorcet_loser": condorcet_loser_explanation,
+    "cycles": cycles_explanation,
+    "Plurality": plurality_explanation,
+    "Borda": borda_explanation,
+    "Minimax": minimax_explanation,
+    "Copeland": copeland_explanation,
+}
+
+
+def generate_explanation(analysis, kind, cmap, cycles=None):
+    """The explanation of ``kind`` as a single markdown document, so that it is sent to the browser in one element.
+
+    Parameters
+    ----------
+    analysis: ProfileAnalysis
+        the analysis of the profile
+    kind: string
+        one of the keys of ``explanation_builders``
+    cmap: dict
+        names of the candidates
+    cycles: list of lists of integers
+        the cycles to explain when ``kind`` is "cycles"
+    """
+    if kind not in explanation_builders:
+        raise ValueError(f"Unknown explanation kind {kind!r}")
+    if kind == "cycles":
+        return cycles_explanation(analysis, cmap, cycles)
+    return explanation_builders[kind](analysis, cmap)
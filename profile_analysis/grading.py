@@ -0,0 +1,155 @@
+import argparse
+import json
+import string
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .analysis import ProfileAnalysis, profile_fingerprint
+from .compact import CompactProfile, generate_anonymized_profile, generate_compact_profile
+from .methods import voting_methods
+
+
+def same_candidate_sets(cs, cnames, cmap):
+    """True when the candidate names ``cnames`` are exactly the names of the candidates ``cs``."""
+    return all([cmap[c] in cnames for c in cs]) and all([cname in [cmap[_c] for _c in cs] for cname in cnames])
+
+
+def winner_feedback(winners, submitted, vm_name, cmap):
+    """The feedback of the tutorial on ``submitted`` (candidate names) as the winners of ``vm_name``.
+
+    Returns a list of (kind, message) pairs, where kind is "success", "error" or "info"
+    (nothing was submitted), in the order the tutorial shows them.
+    """
+    if len(submitted) == 0:
+        return [("info", "You must select some candidates.")]
+    if same_candidate_sets(winners, submitted, cmap):
+        return [("success", f"Correct, the {vm_name} winning set is: {', '.join(submitted)}.")]
+    winner_names = [cmap[w] for w in winners]
+    feedback = [("error", f"${cname}$ is not a {vm_name} winner.") for cname in submitted if cname not in winner_names]
+    feedback += [("error", f"${cmap[w]}$ is a {vm_name} winner.") for w in winners if cmap[w] not in submitted]
+    return feedback
+
+
+def submission_profile(submission):
+    """The profile of a submission: either its "rankings" (with optional "rcounts"), or
+    the random profile of its "num_cands", "num_voters" and "seed" (as in the tutorial,
+    optionally in the "large_election" mode)."""
+    if "rankings" in submission:
+        return CompactProfile(submission["rankings"], submission.get("rcounts"))
+    num_cands, num_voters, seed = int(submission["num_cands"]), int(submission["num_voters"]), int(submission["seed"])
+    if submission.get("large_election"):
+        return generate_compact_profile(num_cands, num_voters, seed=seed)
+    return generate_anonymized_profile(num_cands, num_voters, seed=seed)
+
+
+def evaluate_profiles(items):
+    """The winners of the methods of each profile, as {fingerprint: {method: winners}}.
+
+    ``items`` is a list of (fingerprint, rankings, rcounts, methods); this runs in the
+    worker processes of :func:`grade_submissions`.
+    """
+    results = dict()
+    for fingerprint, rankings, rcounts, methods in items:
+        analysis = ProfileAnalysis(CompactProfile(rankings, rcounts))
+        results[fingerprint] = {vm_name: analysis.winners(vm_name) for vm_name in methods}
+    return results
+
+
+def grade_submissions(submissions, workers=None, chunk_size=50):
+    """Grade the (profile, method, winners) submissions, returning a list of results and statistics.
+
+    Submissions with the same profile (by fingerprint) are grouped, so the winners of each
+    profile and method are computed once, and the groups are evaluated by a process pool
+    (in this process when ``workers`` is 1).  Each result has the "id" of the submission,
+    whether it is "correct" and the "feedback" of the tutorial, or an "invalid" message.
+    """
+    start = time.perf_counter()
+    profiles, methods, fingerprints = dict(), dict(), list()
+    profile_keys = dict()
+    for submission in submissions:
+        try:
+            # random profiles are generated once per (settings, seed)
+            key = json.dumps({k: submission.get(k) for k in ("rankings", "rcounts", "num_cands", "num_voters", "seed", "large_election")}, sort_keys=True)
+            if key not in profile_keys:
+                prof = submission_profile(submission)
+                profile_keys[key] = profile_fingerprint(prof)
+                profiles.setdefault(profile_keys[key], prof)
+            fingerprint = profile_keys[key]
+            if submission["method"] not in voting_methods:
+                raise ValueError(f"unknown voting method {submission['method']!r}")
+            if not voting_methods[submission["method"]].supports(profiles[fingerprint].num_cands):
+                raise ValueError(f"{submission['method']} is only graded for up to {voting_methods[submission['method']].max_candidates} candidates")
+            methods.setdefault(fingerprint, set()).add(submission["method"])
+        except KeyError as e:
+            fingerprint = ValueError(f"missing {e.args[0]!r}")
+        except (TypeError, ValueError) as e:
+            fingerprint = e
+        fingerprints.append(fingerprint)
+
+    items = [(fp, *profiles[fp].rankings_counts, sorted(methods[fp])) for fp in methods]
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    winners = dict()
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            winners.update(evaluate_profiles(chunk))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            for result in pool.map(evaluate_profiles, chunks):
+                winners.update(result)
+
+    results = list()
+    for idx, (submission, fingerprint) in enumerate(zip(submissions, fingerprints)):
+        result = {"id": submission.get("id", idx)}
+        if isinstance(fingerprint, Exception):
+            result["invalid"] = f"invalid submission: {fingerprint}"
+        else:
+            prof = profiles[fingerprint]
+            cmap = {c: string.ascii_letters[c] for c in prof.candidates}
+            submitted = submission.get("winners", list())
+            if isinstance(submitted, str):
+                submitted = [name.strip() for name in submitted.split(",") if name.strip()]
+            unknown = [name for name in submitted if name not in cmap.values()]
+            if unknown:
+                result["invalid"] = f"invalid submission: unknown candidates {', '.join(unknown)}"
+            else:
+                vm_winners = winners[fingerprint][submission["method"]]
+                result["correct"] = len(submitted) > 0 and same_candidate_sets(vm_winners, submitted, cmap)
+                result["feedback"] = [{"kind": kind, "message": message} for kind, message in winner_feedback(vm_winners, submitted, submission["method"], cmap)]
+        results.append(result)
+
+    duration = time.perf_counter() - start
+    stats = {
+        "submissions": len(submissions),
+        "profiles": len(methods),
+        "evaluations": sum(len(ms) for ms in methods.values()),
+        "seconds": duration,
+        "submissions_per_second": len(submissions) / duration if duration > 0 else float("inf"),
+    }
+    return results, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade submitted winning sets, one JSON object per line with a profile, a \"method\" and the \"winners\".")
+    parser.add_argument("submissions", help="JSON lines file of submissions (- for standard input)")
+    parser.add_argument("--output", help="where to write the feedback as JSON lines (default: standard output)")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: the number of CPUs)")
+    args = parser.parse_args(argv)
+
+    with (sys.stdin if args.submissions == "-" else open(args.submissions)) as f:
+        submissions = [json.loads(line) for line in f if line.strip()]
+    results, stats = grade_submissions(submissions, workers=args.workers)
+
+    output = "".join(json.dumps(result) + "\n" for result in results)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output)
+    print(f"graded {stats['submissions']} submissions ({stats['profiles']} profiles, {stats['evaluations']} evaluations) "
+          f"in {stats['seconds']:.2f}s: {stats['submissions_per_second']:.0f} submissions/s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
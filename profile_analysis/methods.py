@@ -0,0 +1,106 @@
+import numpy as np
+
+from .startup import pref_voting_module
+
+
+def max_score_winners(scores):
+    """The candidates with the largest score."""
+    return [int(c) for c in np.flatnonzero(scores == scores.max())]
+
+
+def margin_graph_method(name, **kwargs):
+    """The winners of ``pref_voting.margin_based_methods.<name>`` on the shared margin graph."""
+    def winners(margin_graph):
+        return sorted(int(c) for c in getattr(pref_voting_module("margin_based_methods"), name)(margin_graph, **kwargs))
+    winners.__name__ = name
+    return winners
+
+
+class VotingMethod:
+    """A voting method of the tutorial, computed from inputs shared by all of the methods.
+
+    The inputs are named by methods of :class:`ProfileAnalysis` (e.g., "plurality_score_array",
+    "borda_score_array", "margin_matrix", "majority_matrix" or "margin_graph"), so each of
+    them is computed once per profile, and every method that needs it gets the memoized
+    value.  A method based on the margins only needs to be added to ``voting_methods``.
+
+    Parameters
+    ----------
+    name: string
+        the name of the method
+    winners: function
+        called with the inputs (in the order of ``inputs``), returns the sorted list of winners
+    inputs: tuple of strings
+        the shared inputs of ``winners``
+    label: string
+        the label of the tab of the method (default ``name``)
+    description: string or None
+        markdown describing how the winners are determined, shown before the explanation
+    explanation: string or None
+        the kind of explanation of the winners, see :meth:`ProfileAnalysis.explanation`
+    show_margin_graph: boolean
+        whether the explanation shows the margin graph
+    max_candidates: integer or None
+        the largest number of candidates for which the winners are computed
+    background: boolean
+        whether the app computes the winners in a worker process (see :mod:`profile_analysis.background`),
+        because they may take long on large profiles
+    """
+
+    def __init__(self, name, winners, inputs, label=None, description=None, explanation=None, show_margin_graph=False, max_candidates=None, background=False):
+        self.name = name
+        self.winners = winners
+        self.inputs = tuple(inputs)
+        self.label = name if label is None else label
+        self.description = description
+        self.explanation = explanation
+        self.show_margin_graph = show_margin_graph
+        self.max_candidates = max_candidates
+        self.background = background
+
+    def __repr__(self):
+        return f"VotingMethod({self.name!r}, inputs={self.inputs})"
+
+    def supports(self, num_cands):
+        """Whether the winners are computed for profiles with ``num_cands`` candidates."""
+        return self.max_candidates is None or num_cands <= self.max_candidates
+
+
+voting_methods = {vm.name: vm for vm in [
+    VotingMethod(
+        "Plurality", max_score_winners, ("plurality_score_array",),
+        explanation="Plurality"),
+    VotingMethod(
+        "Borda", max_score_winners, ("borda_score_array",),
+        explanation="Borda"),
+    VotingMethod(
+        "Instant Runoff Voting", lambda rounds: rounds[0], ("irv_rounds",),
+        label="Instant Runoff"),
+    VotingMethod(
+        "Coombs", lambda rounds: rounds[0], ("coombs_rounds",)),
+    VotingMethod(
+        "Minimax", lambda max_losses: max_score_winners(-max_losses), ("max_losses",),
+        description="The **Minimax** winners are determined as follows. Say that the head-to-head loss of a candidate $x$ with a candidate $y$ is the margin of $y$ over $x$.  For each candidate, minimax score for that candidate is the largest head-to-head loss.  Any candidate  with the smallest minimax score is a winner.",
+        explanation="Minimax", show_margin_graph=True),
+    VotingMethod(
+        "Copeland", lambda wins, losses: max_score_winners(wins - losses), ("win_counts", "loss_counts"),
+        description="The **Copeland** winners are determined as follows. Say that the **win-loss record** for a candidate $x$ is the number of candidates that $x$ is majority preferred to minus the number of candidates that is majority preferred to $y$.  Any candidate with the largest win-loss record is a Copeland winner.",
+        explanation="Copeland", show_margin_graph=True),
+    VotingMethod(
+        # the defeats are computed from the strongest paths, without listing the cycles
+        "Split Cycle", lambda defeats: [int(c) for c in np.flatnonzero(~defeats.any(axis=0))], ("split_cycle_defeats",)),
+    VotingMethod(
+        # the winners are those of some way of breaking ties between equal margins, found
+        # with the "stacks" algorithm, which is still exponential in the number of candidates
+        "Ranked Pairs", margin_graph_method("ranked_pairs", algorithm="from_stacks"), ("margin_graph",),
+        description="The **Ranked Pairs** winners are determined as follows.  Order the head-to-head wins from the largest to the smallest margin of victory, and go down the list locking in each win unless it creates a cycle with the wins that are already locked in.  The candidates that do not lose any locked in win are the Ranked Pairs winners.  When several wins have the same margin, every order of these wins is considered: a candidate is a winner if it wins for some order.",
+        show_margin_graph=True, max_candidates=7, background=True),
+    VotingMethod(
+        "Beat Path", margin_graph_method("beat_path"), ("margin_graph",),
+        description="The **Beat Path** winners are determined as follows.  The strength of a path of head-to-head wins from $x$ to $y$ is the smallest margin of victory on the path.  Candidate $x$ defeats $y$ when the strongest path from $x$ to $y$ is stronger than the strongest path from $y$ to $x$.  The candidates that are not defeated are the Beat Path winners.",
+        show_margin_graph=True, background=True),
+    VotingMethod(
+        "Stable Voting", margin_graph_method("stable_voting"), ("margin_graph",),
+        description="The **Stable Voting** winners are determined as follows.  If there is only one candidate, that candidate is the winner.  Otherwise, go down the list of head-to-head matches $x$ vs. $y$ from the largest to the smallest margin of $x$ over $y$ (including negative margins), and $x$ is the winner for the first match in which $x$ is a Stable Voting winner after $y$ is removed from the profile.",
+        show_margin_graph=True, background=True),
+]}
@@ -0,0 +1,388 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import combinations
+from statistics import NormalDist
+
+import numpy as np
+
+from .analysis import ProfileAnalysis
+from .bank import parse_settings
+from .compact import CompactProfile
+from .cycles import widest_paths
+from .methods import voting_methods
+from .startup import worker_safe_main
+
+# the largest number of (profile, voter, candidate, candidate) comparisons in one batch
+MAX_BATCH_ELEMENTS = 2**24
+
+# the simulations the app runs at the same time, whichever sessions start them, and the worker
+# processes each of them may use (VM_TUTORIAL_SIMULATIONS and VM_TUTORIAL_SIMULATION_WORKERS)
+MAX_APP_SIMULATIONS = max(1, int(os.environ.get("VM_TUTORIAL_SIMULATIONS", 1)))
+MAX_APP_WORKERS = max(1, int(os.environ.get("VM_TUTORIAL_SIMULATION_WORKERS", 2)))
+_simulation_slots = threading.BoundedSemaphore(MAX_APP_SIMULATIONS)
+
+
+class ProfileBatch:
+    """Scores and margins of a batch of random profiles, computed with array operations over the whole batch.
+
+    The profiles are drawn from the same model as ``generate_profile`` (impartial culture).
+    Every array has the profiles along its first axis; values are computed the first time
+    they are asked for, as in :class:`ProfileAnalysis`.
+
+    Parameters
+    ----------
+    positions: 3d array of integers
+        the position (starting at 0) of each candidate in the ranking of each voter of each profile
+    """
+
+    def __init__(self, positions):
+        self.positions = np.asarray(positions)
+        self.size, self.num_voters, self.num_cands = self.positions.shape
+        self._memo = dict()
+
+    @classmethod
+    def random(cls, size, num_cands, num_voters, rng):
+        return cls(np.argsort(rng.random((size, num_voters, num_cands)), axis=2))
+
+    def _memoized(self, key, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def profile(self, idx):
+        """The profile ``idx`` of the batch as a :class:`CompactProfile`."""
+        return CompactProfile(np.argsort(self.positions[idx], axis=1))
+
+    def support_matrix(self):
+        return self._memoized("support_matrix", lambda: (self.positions[:, :, :, np.newaxis] < self.positions[:, :, np.newaxis, :]).sum(axis=1))
+
+    def margin_matrix(self):
+        support = self.support_matrix()
+        return self._memoized("margin_matrix", lambda: support - support.transpose(0, 2, 1))
+
+    def majority_matrix(self):
+        return self._memoized("majority_matrix", lambda: self.margin_matrix() > 0)
+
+    def win_counts(self):
+        return self._memoized("win_counts", lambda: self.majority_matrix().sum(axis=2))
+
+    def loss_counts(self):
+        return self._memoized("loss_counts", lambda: self.majority_matrix().sum(axis=1))
+
+    def max_losses(self):
+        return self._memoized("max_losses", lambda: self.margin_matrix().max(axis=1))
+
+    def plurality_score_array(self):
+        return self._memoized("plurality_score_array", lambda: self.first_place_counts(np.ones((self.size, self.num_cands), dtype=bool)))
+
+    def borda_score_array(self):
+        return self._memoized("borda_score_array", lambda: (self.num_cands - 1 - self.positions).sum(axis=1))
+
+    def strongest_paths(self):
+        return self._memoized("strongest_paths", lambda: widest_paths(np.where(self.majority_matrix(), self.margin_matrix(), 0)))
+
+    def condorcet_winner(self):
+        """Boolean array of the Condorcet winner (if any) of each profile."""
+        return self.win_counts() == self.num_cands - 1
+
+    def condorcet_loser(self):
+        return self.loss_counts() == self.num_cands - 1
+
+    def majority_winner(self):
+        return self.plurality_score_array() >= self.num_voters // 2 + 1
+
+    def has_cycle(self):
+        """Whether each profile has a majority cycle."""
+        reach = self.majority_matrix().copy()
+        for k in range(self.num_cands):
+            reach |= reach[:, :, k, np.newaxis] & reach[:, np.newaxis, k, :]
+        return reach.diagonal(axis1=1, axis2=2).any(axis=1)
+
+    def first_place_counts(self, remaining):
+        """The number of first-place votes of each candidate when only the ``remaining`` candidates are ranked."""
+        top = np.where(remaining[:, np.newaxis, :], self.positions, self.num_cands).argmin(axis=2)
+        return (top[:, :, np.newaxis] == np.arange(self.num_cands)).sum(axis=1)
+
+    def last_place_counts(self, remaining):
+        bottom = np.where(remaining[:, np.newaxis, :], self.positions, -1).argmax(axis=2)
+        return (bottom[:, :, np.newaxis] == np.arange(self.num_cands)).sum(axis=1)
+
+    def elimination_winners(self, select):
+        """The winners of the elimination (as in :func:`run_elimination`) in which ``select`` gives the candidates removed in a round."""
+        remaining = np.ones((self.size, self.num_cands), dtype=bool)
+        winners = np.zeros((self.size, self.num_cands), dtype=bool)
+        done = np.zeros(self.size, dtype=bool)
+        while not done.all():
+            majority = remaining & (self.first_place_counts(remaining) >= self.num_voters // 2 + 1)
+            found = ~done & majority.any(axis=1)
+            winners[found], done = majority[found], done | found
+            removed = select(self, remaining) & ~done[:, np.newaxis]
+            left = remaining & ~removed
+            num_left = left.sum(axis=1)
+            # every remaining candidate removed: they are all winners; one left: it is the winner
+            winners[~done & (num_left == 0)] = removed[~done & (num_left == 0)]
+            winners[~done & (num_left == 1)] = left[~done & (num_left == 1)]
+            done |= num_left <= 1
+            remaining = np.where(done[:, np.newaxis], remaining, left)
+        return winners
+
+
+def fewest_first_place(batch, remaining):
+    scores = np.where(remaining, batch.first_place_counts(remaining), np.iinfo(np.int64).max)
+    return remaining & (scores == scores.min(axis=1, keepdims=True))
+
+
+def most_last_place(batch, remaining):
+    scores = np.where(remaining, batch.last_place_counts(remaining), -1)
+    return remaining & (scores == scores.max(axis=1, keepdims=True))
+
+
+def max_score_mask(scores):
+    """Boolean array of the candidates with the largest score in each profile."""
+    return scores == scores.max(axis=1, keepdims=True)
+
+
+# winners (as boolean arrays) of the methods that are computed for a whole batch at once,
+# the other methods are computed one profile at a time with ProfileAnalysis
+batch_winners = {
+    "Plurality": lambda batch: max_score_mask(batch.plurality_score_array()),
+    "Borda": lambda batch: max_score_mask(batch.borda_score_array()),
+    "Instant Runoff Voting": lambda batch: batch.elimination_winners(fewest_first_place),
+    "Coombs": lambda batch: batch.elimination_winners(most_last_place),
+    "Minimax": lambda batch: max_score_mask(-batch.max_losses()),
+    "Copeland": lambda batch: max_score_mask(batch.win_counts() - batch.loss_counts()),
+    # x defeats y when the margin of x over y is larger than the strongest path from y back to x
+    "Split Cycle": lambda batch: ~(batch.majority_matrix() & (batch.margin_matrix() > batch.strongest_paths().transpose(0, 2, 1))).any(axis=1),
+    "Beat Path": lambda batch: ~(batch.strongest_paths() > batch.strongest_paths().transpose(0, 2, 1)).any(axis=1),
+}
+
+
+def winner_masks(batch, vm_name):
+    if vm_name in batch_winners:
+        return batch_winners[vm_name](batch)
+    masks = np.zeros((batch.size, batch.num_cands), dtype=bool)
+    for idx in range(batch.size):
+        masks[idx, ProfileAnalysis(batch.profile(idx)).winners(vm_name)] = True
+    return masks
+
+
+def simulate_batch(num_cands, num_voters, methods, size, seed):
+    """Count the events of :class:`SimulationTally` in ``size`` random profiles.
+
+    This runs in the worker processes of :func:`simulate`.
+    """
+    batch = ProfileBatch.random(size, num_cands, num_voters, np.random.default_rng(seed))
+    condorcet_winner, condorcet_loser = batch.condorcet_winner(), batch.condorcet_loser()
+    has_condorcet_winner = condorcet_winner.any(axis=1)
+    counts = {
+        "profiles": size,
+        "condorcet_winner": int(has_condorcet_winner.sum()),
+        "condorcet_loser": int(condorcet_loser.any(axis=1).sum()),
+        "majority_winner": int(batch.majority_winner().any(axis=1).sum()),
+        "majority_cycle": int(batch.has_cycle().sum()),
+    }
+    winners = {vm_name: winner_masks(batch, vm_name) for vm_name in methods}
+    for vm_name, ws in winners.items():
+        unique = ws.sum(axis=1) == 1
+        counts[f"unique:{vm_name}"] = int(unique.sum())
+        counts[f"condorcet_winner_elected:{vm_name}"] = int((has_condorcet_winner & unique & (ws == condorcet_winner).all(axis=1)).sum())
+        counts[f"condorcet_loser_wins:{vm_name}"] = int((ws & condorcet_loser).any(axis=1).sum())
+    for vm1, vm2 in combinations(methods, 2):
+        counts[f"disagree:{vm1}|{vm2}"] = int((winners[vm1] != winners[vm2]).any(axis=1).sum())
+    return counts
+
+
+def wilson_interval(successes, trials, z):
+    """The Wilson score interval of a frequency."""
+    p = successes / trials
+    center = (p + z * z / (2 * trials)) / (1 + z * z / trials)
+    half_width = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / (1 + z * z / trials)
+    return center - half_width, center + half_width
+
+
+class SimulationTally:
+    """The running counts of a simulation of one (num_cands, num_voters) setting.
+
+    Each statistic is a frequency: the number of profiles with some property out of the
+    profiles in which it is asked (e.g., how often a method elects the Condorcet winner,
+    out of the profiles with a Condorcet winner).
+
+    Parameters
+    ----------
+    num_cands: integer
+    num_voters: integer
+    methods: list of strings
+        the names of the voting methods that are compared
+    """
+
+    def __init__(self, num_cands, num_voters, methods):
+        self.num_cands = num_cands
+        self.num_voters = num_voters
+        self.methods = list(methods)
+        self.counts = dict()
+        self.statistics = [
+            ("There is a Condorcet winner", "condorcet_winner", "profiles"),
+            ("There is a Condorcet loser", "condorcet_loser", "profiles"),
+            ("There is a majority winner", "majority_winner", "profiles"),
+            ("There is a majority cycle", "majority_cycle", "profiles"),
+        ]
+        for vm_name in self.methods:
+            self.statistics += [
+                (f"{vm_name} has a unique winner", f"unique:{vm_name}", "profiles"),
+                (f"{vm_name} elects the Condorcet winner (when there is one)", f"condorcet_winner_elected:{vm_name}", "condorcet_winner"),
+                (f"The Condorcet loser is a {vm_name} winner (when there is one)", f"condorcet_loser_wins:{vm_name}", "condorcet_loser"),
+            ]
+        self.statistics += [(f"{vm1} and {vm2} have different winners", f"disagree:{vm1}|{vm2}", "profiles")
+                            for vm1, vm2 in combinations(self.methods, 2)]
+
+    @property
+    def profiles(self):
+        return self.counts.get("profiles", 0)
+
+    def add(self, counts):
+        for key, count in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def rows(self, confidence=0.95):
+        """The frequency of each statistic with its confidence interval (None while it can't be estimated)."""
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        rows = list()
+        for label, key, of in self.statistics:
+            trials = self.counts.get(of, 0)
+            row = {"statistic": label, "frequency": None, "low": None, "high": None, "profiles": trials}
+            if trials > 0:
+                row["frequency"] = self.counts.get(key, 0) / trials
+                row["low"], row["high"] = wilson_interval(self.counts.get(key, 0), trials, z)
+            rows.append(row)
+        return rows
+
+    def half_width(self, confidence=0.95):
+        """The largest half-width of the confidence intervals (statistics that can't be estimated yet are skipped)."""
+        return max([(row["high"] - row["low"]) / 2 for row in self.rows(confidence) if row["frequency"] is not None], default=float("inf"))
+
+    def converged(self, tolerance, confidence=0.95, min_profiles=1000):
+        return self.profiles >= min_profiles and self.half_width(confidence) <= tolerance
+
+
+def batch_size_for(num_cands, num_voters, methods, batch_size):
+    """The batch size, made smaller for large settings so a batch fits in ``MAX_BATCH_ELEMENTS``,
+    and when some method is computed one profile at a time, so progress is still reported."""
+    if any(vm_name not in batch_winners for vm_name in methods):
+        batch_size = min(batch_size, 50)
+    return max(1, min(batch_size, MAX_BATCH_ELEMENTS // (num_voters * num_cands * num_cands)))
+
+
+class SimulationSlot:
+    """One of the ``MAX_APP_SIMULATIONS`` simulations the app may run at the same time.
+
+    Used as a context manager, which is true when a slot was free; the slot is held until the
+    end of the block, also when the simulation is stopped by a rerun of the session.
+    """
+
+    def __init__(self):
+        self.acquired = False
+
+    def __enter__(self):
+        self.acquired = _simulation_slots.acquire(blocking=False)
+        return self.acquired
+
+    def __exit__(self, *exc):
+        if self.acquired:
+            self.acquired = False
+            _simulation_slots.release()
+        return False
+
+
+def simulate(settings, methods, max_profiles=100000, tolerance=0.005, confidence=0.95, batch_size=2000, workers=None, seed=None):
+    """Simulate random profiles for each (num_cands, num_voters) in ``settings`` and tally how often the events occur.
+
+    Batches of profiles are evaluated by a process pool (in this process when ``workers``
+    is 1), at most two batches per worker at a time.  After every batch this yields the
+    setting and its :class:`SimulationTally`, so the frequencies can be shown as they
+    converge.  A setting stops when every confidence interval is within ``tolerance``, or
+    after ``max_profiles`` profiles.
+    """
+    for vm_name in methods:
+        vm = voting_methods[vm_name]
+        if any(not vm.supports(num_cands) for num_cands, _ in settings):
+            raise ValueError(f"{vm_name} winners are only computed for up to {vm.max_candidates} candidates")
+    seed_seq = np.random.SeedSequence(seed)
+    pool, max_pending = None, 2 * (workers or os.cpu_count() or 1)
+    if workers != 1:
+        # the pool may be started from a thread of the Streamlit server, which can't be forked safely
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for num_cands, num_voters in settings:
+            tally = SimulationTally(num_cands, num_voters, methods)
+            size = batch_size_for(num_cands, num_voters, methods, batch_size)
+            submitted = 0
+
+            def next_batch():
+                nonlocal submitted
+                count = min(size, max_profiles - submitted)
+                submitted += count
+                return num_cands, num_voters, list(methods), count, seed_seq.spawn(1)[0]
+
+            if pool is None:
+                while submitted < max_profiles and not tally.converged(tolerance, confidence):
+                    tally.add(simulate_batch(*next_batch()))
+                    yield (num_cands, num_voters), tally
+                continue
+
+            pending = set()
+            while True:
+                while submitted < max_profiles and len(pending) < max_pending and not tally.converged(tolerance, confidence):
+                    # the workers are started by the first submissions
+                    with worker_safe_main():
+                        pending.add(pool.submit(simulate_batch, *next_batch()))
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    tally.add(future.result())
+                yield (num_cands, num_voters), tally
+                if tally.converged(tolerance, confidence):
+                    for future in pending:
+                        future.cancel()
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate how often the properties of random profiles occur, e.g., how often there is no Condorcet winner.")
+    parser.add_argument("--settings", default="3-5x5,3-5x11,3-5x51", help="<candidates>x<voters> settings, comma separated, with ranges (default %(default)s)")
+    parser.add_argument("--methods", default=",".join(batch_winners), help="voting methods, comma separated (default: the methods computed for whole batches)")
+    parser.add_argument("--max-profiles", type=int, default=100000, help="largest number of profiles for each setting (default %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=0.005, help="stop when every confidence interval is within this (default %(default)s)")
+    parser.add_argument("--seed", type=int, help="seed of the simulation")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: the number of CPUs)")
+    args = parser.parse_args(argv)
+
+    methods = [m.strip() for m in args.methods.split(",")]
+    unknown = [m for m in methods if m not in voting_methods]
+    if unknown:
+        parser.error(f"unknown voting methods {', '.join(unknown)}")
+
+    start, results = time.perf_counter(), dict()
+    try:
+        for setting, tally in simulate(parse_settings(args.settings), methods, max_profiles=args.max_profiles, tolerance=args.tolerance, seed=args.seed, workers=args.workers):
+            results[setting] = tally
+    except ValueError as e:
+        parser.error(str(e))
+    for (num_cands, num_voters), tally in results.items():
+        print(json.dumps({"num_cands": num_cands, "num_voters": num_voters, "profiles": tally.profiles, "statistics": tally.rows()}))
+    print(f"simulated {sum(t.profiles for t in results.values())} profiles in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
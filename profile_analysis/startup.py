@@ -0,0 +1,95 @@
+import argparse
+import contextlib
+import importlib
+import sys
+import threading
+import time
+import types
+
+# the modules of pref_voting with numba functions; they are compiled the first time they run
+JIT_MODULES = ("pref_voting.profiles", "pref_voting.voting_method", "pref_voting.utility_functions")
+
+_jit_cache_enabled = False
+_lock = threading.Lock()
+
+
+def enable_jit_cache():
+    """Make the numba functions of pref_voting save their compiled code on disk, and load it
+    from there when it was saved before (e.g., by :func:`warmup` when the app is built).
+
+    The code is cached next to the modules (in ``__pycache__``), or in the directory
+    ``NUMBA_CACHE_DIR`` when that is set.
+    """
+    global _jit_cache_enabled
+    if _jit_cache_enabled:
+        return
+    with _lock:
+        if _jit_cache_enabled:
+            return
+        from numba.core.dispatcher import Dispatcher
+        for name in JIT_MODULES:
+            for obj in vars(importlib.import_module(name)).values():
+                # functions that were already compiled in this process are not cached
+                if isinstance(obj, Dispatcher) and not obj.overloads:
+                    obj.enable_caching()
+        _jit_cache_enabled = True
+
+
+def pref_voting_module(name):
+    """The module ``pref_voting.<name>``, imported on first use with the JIT cache enabled.
+
+    Importing pref_voting pulls in numba, scipy, matplotlib and more, so the tutorial only
+    imports it when a method that is not computed by profile_analysis is needed.
+    """
+    module = importlib.import_module(f"pref_voting.{name}")
+    enable_jit_cache()
+    return module
+
+
+@contextlib.contextmanager
+def worker_safe_main():
+    """Start "spawn" worker processes within this block when running in a Streamlit script.
+
+    Streamlit runs the script of a page as the module ``__main__``, and a new "spawn"
+    worker imports ``__main__`` again from its path, which would run the whole page in the
+    worker.  Within this block a script run from a path is replaced by an empty module (a
+    module run with ``python -m`` is kept, since its functions are pickled as ``__main__``).
+    """
+    main = sys.modules.get("__main__")
+    if main is None or getattr(main, "__spec__", None) is not None:
+        yield
+        return
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def warmup():
+    """Run the computations of the tutorial once, so the modules of pref_voting they import are
+    compiled and the numba functions they run are cached on disk, returning the seconds taken by each step."""
+    from .analysis import ProfileAnalysis
+    from .compact import generate_compact_profile
+
+    timings = dict()
+    start = time.perf_counter()
+    # the modules the methods of the tutorial use (the margin graph and the margin based methods)
+    for name in ("weighted_majority_graphs", "margin_based_methods"):
+        pref_voting_module(name)
+    timings["import"] = time.perf_counter() - start
+    for num_cands, num_voters in ((3, 5), (7, 15)):
+        start = time.perf_counter()
+        analysis = ProfileAnalysis(generate_compact_profile(num_cands, num_voters, seed=0))
+        analysis.compute_all()
+        timings[f"{num_cands}x{num_voters}"] = time.perf_counter() - start
+    return timings
+
+
+def main(argv=None):
+    """Warm up the JIT cache (run by bin/post_compile when the app is built)."""
+    parser = argparse.ArgumentParser(description="Compile and cache the JIT-compiled code of pref_voting used by the tutorial.")
+    parser.parse_args(argv)
+    for step, seconds in warmup().items():
+        print(f"{step:10} {seconds:6.2f}s", file=sys.stderr)
+    return 0
@@ -0,0 +1,156 @@
+import glob
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from importlib import metadata
+
+
+def code_version():
+    """The version of the code that computes the stored values: a hash of the modules of
+    profile_analysis and the version of pref_voting."""
+    h = hashlib.blake2b(digest_size=8)
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    try:
+        h.update(metadata.version("pref_voting").encode())
+    except metadata.PackageNotFoundError:
+        pass
+    return h.hexdigest()
+
+
+class AnalysisStore:
+    """A SQLite database of computed analysis values, shared by the app processes on one machine.
+
+    The in-process caches (see :data:`analysis_cache`) are lost with the process and are
+    not shared between processes.  When several app processes run behind a load balancer,
+    the store lets them share what any of them computed: the values of the memo of each
+    analysis (answers, explanation data, rendered diagrams and explanations) and the
+    generated profiles, keyed by the key of the profile (see :func:`get_analysis`).
+
+    Values are written once, when they are computed, and read when a process creates the
+    analysis of a profile.  Every value is stored with the version of the code (see
+    :func:`code_version`), and only the values of the current version are read, so a
+    deploy doesn't serve values computed by the previous code; a value that can't be
+    unpickled is treated as missing.  Rows older than ``ttl`` seconds are deleted when the
+    store is opened.  The store is enabled by setting ``VM_TUTORIAL_ANALYSIS_STORE`` to the
+    path of the database (see :meth:`from_environment`).
+
+    Parameters
+    ----------
+    path: string
+        path of the SQLite database, created if needed
+    ttl: number or None
+        number of seconds a value is kept (None means forever)
+    version: string or None
+        the version of the stored values (default :func:`code_version`)
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, version=None):
+        self.path = path
+        self.ttl = ttl
+        self.version = code_version() if version is None else version
+        # one connection shared by the threads of the process, with WAL so that readers in
+        # other processes don't wait for a writer
+        self._connection = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        # the keys this process knows are in the store, for the most recent profiles
+        self._saved = OrderedDict()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            # the values of an analysis (kind "analysis") and the other shared values (kind "value")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS stored_values ("
+                " version TEXT NOT NULL, kind TEXT NOT NULL, profile TEXT NOT NULL, key TEXT NOT NULL,"
+                " value BLOB NOT NULL, created REAL NOT NULL, PRIMARY KEY (version, kind, profile, key))")
+            if ttl is not None:
+                self._connection.execute("DELETE FROM stored_values WHERE created < ?", (time.time() - ttl,))
+
+    @classmethod
+    def from_environment(cls):
+        """The store at ``VM_TUTORIAL_ANALYSIS_STORE`` (None when it is not set), keeping values
+        for ``VM_TUTORIAL_ANALYSIS_STORE_TTL`` seconds (default one week, 0 for forever), with
+        the version ``VM_TUTORIAL_ANALYSIS_STORE_VERSION`` (default :func:`code_version`)."""
+        path = os.environ.get("VM_TUTORIAL_ANALYSIS_STORE")
+        if not path:
+            return None
+        ttl = float(os.environ.get("VM_TUTORIAL_ANALYSIS_STORE_TTL", 7 * 24 * 3600))
+        return cls(path, ttl=ttl or None, version=os.environ.get("VM_TUTORIAL_ANALYSIS_STORE_VERSION") or None)
+
+    def _saved_keys(self, profile):
+        saved = self._saved.setdefault(profile, set())
+        self._saved.move_to_end(profile)
+        while len(self._saved) > 1024:
+            self._saved.popitem(last=False)
+        return saved
+
+    @staticmethod
+    def _unpickle(value):
+        # values pickled by other code (e.g., a class that was renamed) are missing values
+        try:
+            return pickle.loads(value)
+        except Exception:
+            return None
+
+    def load(self, profile):
+        """The stored values of the analysis of ``profile``, keyed as in the memo of :class:`ProfileAnalysis`."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT value FROM stored_values WHERE version = ? AND kind = 'analysis' AND profile = ?",
+                (self.version, profile)).fetchall()
+            values = dict(item for item in (self._unpickle(value) for value, in rows) if item is not None)
+            self._saved_keys(profile).update(repr(key) for key in values)
+        return values
+
+    def _rows(self, kind, profile, values):
+        rows = list()
+        for key, value in values.items():
+            try:
+                rows.append((self.version, kind, profile, repr(key), pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL), time.time()))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                pass
+        return rows
+
+    def save(self, profile, values):
+        """Store the ``values`` of the analysis of ``profile`` that are not stored yet; values that can't be pickled are skipped."""
+        with self._lock:
+            saved = self._saved_keys(profile)
+            rows = self._rows("analysis", profile, {key: value for key, value in values.items() if repr(key) not in saved})
+            saved.update(repr(key) for key in values)
+            if rows:
+                self._connection.executemany("INSERT OR IGNORE INTO stored_values VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def get_or_compute(self, name, key, compute):
+        """The value stored under ``key`` in ``name`` (e.g., "generated profiles"), calling ``compute()`` to create (and store) it if needed.
+
+        These values are not part of an analysis, :meth:`load` doesn't return them.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM stored_values WHERE version = ? AND kind = 'value' AND profile = ? AND key = ?",
+                (self.version, name, repr(key))).fetchone()
+        item = None if row is None else self._unpickle(row[0])
+        if item is not None:
+            return item[1]
+        value = compute()
+        rows = self._rows("value", name, {key: value})
+        with self._lock:
+            if rows:
+                self._connection.executemany("INSERT OR REPLACE INTO stored_values VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return value
+
+    def stats(self):
+        """The number of profiles and values in the store for the current version, and the bytes used by the values."""
+        with self._lock:
+            profiles, values, nbytes = self._connection.execute(
+                "SELECT COUNT(DISTINCT profile), COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM stored_values"
+                " WHERE version = ? AND kind = 'analysis'", (self.version,)).fetchone()
+        return {"profiles": profiles, "values": values, "bytes": nbytes}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,179 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger("profile_analysis.timing")
+
+# the spans of the run (e.g., one rerun of the app) in progress in the current context
+_current_run = contextvars.ContextVar("current_run", default=None)
+_depth = contextvars.ContextVar("span_depth", default=0)
+
+
+class SpanStats:
+    """Rolling statistics of the durations of each kind of span (thread-safe).
+
+    Parameters
+    ----------
+    window: int
+        the number of most recent durations of each span kept for the percentiles
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._durations = dict()
+        self._counts = dict()
+        self._lock = threading.Lock()
+
+    def add(self, name, duration):
+        with self._lock:
+            if name not in self._durations:
+                self._durations[name] = deque(maxlen=self.window)
+                self._counts[name] = 0
+            self._durations[name].append(duration)
+            self._counts[name] += 1
+
+    def clear(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """A list with, for each span, the number of times it ran and the percentiles (in milliseconds) of its recent durations."""
+        with self._lock:
+            durations = {name: np.array(ds) for name, ds in self._durations.items()}
+            counts = dict(self._counts)
+        rows = list()
+        for name in sorted(durations):
+            row = {"span": name, "count": counts[name]}
+            for q, v in zip(percentiles, np.percentile(durations[name] * 1000, percentiles)):
+                row[f"p{q}_ms"] = float(v)
+            rows.append(row)
+        return rows
+
+
+span_stats = SpanStats()
+
+
+class RunTimings:
+    """The spans recorded during one run, in the order they started."""
+
+    def __init__(self, **fields):
+        self.fields = fields
+        self.spans = list()
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def breakdown(self):
+        """A list with the name, nesting depth and duration (in milliseconds) of each span."""
+        return [{"span": name, "depth": depth, "ms": duration * 1000} for name, depth, duration, _ in self.spans]
+
+
+def start_run(**fields):
+    """Start recording the spans of a new run in the current context; ``fields`` are added to every log record."""
+    run = RunTimings(**fields)
+    _current_run.set(run)
+    _depth.set(0)
+    return run
+
+
+def current_run():
+    return _current_run.get()
+
+
+def finish_run(name="run"):
+    """Record the duration of the current run as the span ``name`` and return the run."""
+    run = _current_run.get()
+    if run is None:
+        return None
+    run.duration = run.elapsed()
+    span_stats.add(name, run.duration)
+    _log(name, run.duration, 0, run, dict(spans=len(run.spans)))
+    return run
+
+
+def _log(name, duration, depth, run, fields):
+    if logger.isEnabledFor(logging.INFO):
+        record = {"span": name, "ms": round(duration * 1000, 3), "depth": depth}
+        if run is not None:
+            record.update(run.fields)
+        record.update(fields)
+        logger.info(json.dumps(record, default=str))
+
+
+@contextmanager
+def span(name, **fields):
+    """Time the block as the span ``name``.
+
+    The duration is added to the rolling statistics, to the current run (if any) and is
+    logged as a JSON object to the ``profile_analysis.timing`` logger.
+    """
+    run = _current_run.get()
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    entry = None
+    if run is not None:
+        entry = [name, depth, None, fields]
+        run.spans.append(entry)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _depth.reset(token)
+        if entry is not None:
+            entry[2] = duration
+        span_stats.add(name, duration)
+        _log(name, duration, depth, run, fields)
+
+
+@contextmanager
+def span_or_run(name, **fields):
+    """Time the block as the span ``name`` of the run in progress or, when there is none
+    (e.g., a partial rerun of a part of the app), as a run of its own."""
+    run = _current_run.get()
+    if run is not None and run.duration is None:
+        with span(name, **fields):
+            yield
+        return
+    start_run(partial=name, **fields)
+    try:
+        yield
+    finally:
+        finish_run(name)
+
+
+def timed(name):
+    """Decorator timing every call of the function as the span ``name``."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def log_to_file(path, level=logging.INFO):
+    """Write the spans as JSON lines to the file ``path``."""
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('{"time": "%(asctime)s", "record": %(message)s}'))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return handler
+
+
+# e.g., PROFILE_ANALYSIS_TIMING_LOG=timings.jsonl streamlit run vm-tutorial.py
+if os.environ.get("PROFILE_ANALYSIS_TIMING_LOG"):
+    log_to_file(os.environ["PROFILE_ANALYSIS_TIMING_LOG"])
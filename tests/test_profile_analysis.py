@@ -0,0 +1,134 @@
+"""Checks of profile_analysis against pref_voting on seeded random profiles, and round trips
+of the exercise bank and the analysis store.
+
+Run from the repository root with ``python -m pytest tests``.
+"""
+
+import sqlite3
+
+import numpy as np
+import pytest
+from pref_voting import c1_methods, iterative_methods, margin_based_methods, scoring_methods
+
+from profile_analysis import AnalysisStore, ProfileAnalysis, generate_compact_profile, voting_methods
+from profile_analysis.bank import ExerciseBank, generate_exercises, write_bank
+from profile_analysis.compact import generate_anonymized_profile
+
+PREF_VOTING_METHODS = {
+    "Plurality": scoring_methods.plurality,
+    "Borda": scoring_methods.borda,
+    "Instant Runoff Voting": iterative_methods.instant_runoff,
+    "Coombs": iterative_methods.coombs,
+    "Minimax": margin_based_methods.minimax,
+    "Copeland": c1_methods.copeland,
+    "Split Cycle": margin_based_methods.split_cycle,
+    "Ranked Pairs": margin_based_methods.ranked_pairs,
+    "Beat Path": margin_based_methods.beat_path,
+    "Stable Voting": margin_based_methods.stable_voting,
+}
+
+# pref_voting's Ranked Pairs tries every order of the wins with equal margins (the app uses
+# the "stacks" algorithm), so it is only compared where there are few of them
+COMPARED = {"Ranked Pairs": lambda profile: profile.num_cands <= 5 and profile.num_voters % 2 == 1}
+
+# odd and even numbers of voters, so that some profiles have ties
+PROFILES = [(num_cands, num_voters, seed) for num_cands in (2, 3, 4, 5, 6) for num_voters in (1, 4, 5, 10, 11) for seed in range(4)]
+
+
+def profile_id(params):
+    return "{}x{}-{}".format(*params)
+
+
+@pytest.fixture(params=PROFILES, ids=profile_id)
+def profile(request):
+    num_cands, num_voters, seed = request.param
+    return generate_compact_profile(num_cands, num_voters, seed=seed)
+
+
+def test_methods_are_checked():
+    assert set(PREF_VOTING_METHODS) == set(voting_methods)
+
+
+def test_winners(profile):
+    analysis, pv_profile = ProfileAnalysis(profile), profile.to_profile()
+    for vm_name, vm in voting_methods.items():
+        if vm.supports(profile.num_cands) and COMPARED.get(vm_name, lambda profile: True)(profile):
+            assert analysis.winners(vm_name) == sorted(PREF_VOTING_METHODS[vm_name](pv_profile)), vm_name
+
+
+@pytest.mark.parametrize("rounds, with_explanation", [
+    ("irv_rounds", iterative_methods.instant_runoff_with_explanation),
+    ("coombs_rounds", iterative_methods.coombs_with_explanation),
+])
+def test_elimination_rounds(profile, rounds, with_explanation):
+    winners, elimination = getattr(ProfileAnalysis(profile), rounds)()
+    expected_winners, expected_elimination = with_explanation(profile.to_profile())
+    assert winners == sorted(expected_winners)
+    assert [sorted(r["removed"]) for r in elimination] == [sorted(removed) for removed in expected_elimination]
+    remaining = np.ones(profile.num_cands, dtype=bool)
+    for r in elimination:
+        remaining[r["removed"]] = False
+        np.testing.assert_array_equal(r["remaining"], remaining)
+
+
+def test_split_cycle_defeats(profile):
+    expected = np.zeros((profile.num_cands, profile.num_cands), dtype=bool)
+    for c1, c2 in margin_based_methods.split_cycle_defeat(profile.to_profile()).edges:
+        expected[c1, c2] = True
+    np.testing.assert_array_equal(ProfileAnalysis(profile).split_cycle_defeats(), expected)
+
+
+def test_exercise_bank_round_trip(tmp_path):
+    settings, seeds = [(3, 5), (4, 6), (5, 11)], list(range(20))
+    write_bank(tmp_path / "test.vmbank", {(c, v): generate_exercises(c, v, seeds) for c, v in settings})
+    bank = ExerciseBank(str(tmp_path / "test.vmbank"))
+    assert bank.settings == settings
+    for num_cands, num_voters in settings:
+        for index, seed in enumerate(seeds):
+            assert bank.seed(num_cands, num_voters, index) == seed
+            prof = generate_anonymized_profile(num_cands, num_voters, seed=seed)
+            assert bank.profile(num_cands, num_voters, index) == prof
+
+            answers, expected = bank.answers(num_cands, num_voters, index), ProfileAnalysis(prof)
+            np.testing.assert_array_equal(answers["margin_matrix"], expected.margin_matrix())
+            for key in ("condorcet_winner", "condorcet_loser", "plurality_scores", "borda_scores"):
+                assert answers[key] == getattr(expected, key)(), key
+            for vm_name in voting_methods:
+                assert answers[("winners", vm_name)] == expected.winners(vm_name), vm_name
+            for key in ("irv_rounds", "coombs_rounds"):
+                (winners, rounds), (expected_winners, expected_rounds) = answers[key], getattr(expected, key)()
+                assert winners == expected_winners
+                assert len(rounds) == len(expected_rounds)
+                for r, expected_r in zip(rounds, expected_rounds):
+                    assert r["removed"] == expected_r["removed"]
+                    assert r["majority_winner"] == expected_r["majority_winner"]
+                    np.testing.assert_array_equal(r["remaining"], expected_r["remaining"])
+
+
+def test_analysis_store_round_trip(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    prof = generate_compact_profile(5, 11, seed=1)
+    analysis = ProfileAnalysis(prof, store=AnalysisStore(path, version="1"), store_key="profile").compute_all()
+
+    values = AnalysisStore(path, version="1").load("profile")
+    assert ("winners", "Borda") in values and "irv_rounds" in values
+    stored = ProfileAnalysis(prof).preload(values)
+    np.testing.assert_array_equal(stored.margin_matrix(), analysis.margin_matrix())
+    for vm_name in voting_methods:
+        assert stored.memoized(("winners", vm_name)) == analysis.winners(vm_name), vm_name
+
+    # the values of another version of the code are not read
+    assert AnalysisStore(path, version="2").load("profile") == {}
+
+    # shared values are stored apart from the analyses
+    store, calls = AnalysisStore(path, version="1"), list()
+    assert store.get_or_compute("generated profiles", "key", lambda: calls.append(1) or prof) == prof
+    assert AnalysisStore(path, version="1").get_or_compute("generated profiles", "key", lambda: calls.append(1) or prof) == prof
+    assert len(calls) == 1
+    assert "key" not in AnalysisStore(path, version="1").load("generated profiles")
+
+    # a value that can't be unpickled is missing
+    with sqlite3.connect(path) as connection:
+        connection.execute("UPDATE stored_values SET value = ? WHERE key = ?", (b"damaged", repr("margin_matrix")))
+    values = AnalysisStore(path, version="1").load("profile")
+    assert "margin_matrix" not in values and ("winners", "Borda") in values
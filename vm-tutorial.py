@@ -1,65 +1,81 @@
+import functools
+import os
 import streamlit as st
-import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import string
 from  display_profile import *
 from itertools import combinations
 import numpy as np
 
-from pref_voting.profiles import Profile
-from pref_voting.generate_profiles import *
-from pref_voting.voting_methods import *
+# pref_voting (with numba, scipy, matplotlib, ...) is only imported when a method needs it,
+# see profile_analysis.startup
+from profile_analysis import CompactProfile, analysis_cache, analysis_store, deep_getsizeof, finish_run, generate_compact_profile, get_analysis, parse_profile_key, profile_cache, profile_key, ranking_types_by_count, session_footprints, span, span_stats, start_run, voting_methods
+from profile_analysis.background import background_pool
+from profile_analysis.bank import ExerciseBank
+from profile_analysis.compact import generate_anonymized_profile
+from profile_analysis.elimination import ballot_view
+from profile_analysis.grading import winner_feedback
+from profile_analysis.timing import span_or_run, timed
 
-def margin_str(prof, c1, c2, cmap): 
-    return f"$Margin({cmap[c1]}, {cmap[c2]}) = {prof.margin(c1, c2)}$"
+# every rerun records timing spans of its stages (see profile_analysis.timing)
+st.session_state["reruns"] = st.session_state.get("reruns", 0) + 1
+start_run(rerun=st.session_state["reruns"])
 
 def cand_list_str(cs, cmap): 
     return f"{', '.join([cmap[c] for c in cs])}"
 
-def same_candidate_sets(cs, cnames, cmap): 
-    return all([cmap[c] in cnames for c in cs]) and all([cname in [cmap[_c] for _c in cs] for cname in cnames])
-
-condorcet_cycle = Profile([
+def show_feedback(feedback):
+    # the feedback on a submitted winning set, see profile_analysis.grading.winner_feedback
+    for kind, message in feedback:
+        if kind == "success":
+            st.success(message)
+        elif kind == "error":
+            st.error(message)
+        else:
+            st.write(message)
+
+condorcet_cycle = CompactProfile([
     (0, 1, 2),
     (1, 2, 0),
     (2, 0, 1)
-])
+], sort=False)
 
-condorcet_cycle_with_winner = Profile([
+condorcet_cycle_with_winner = CompactProfile([
     (3, 0, 1, 2),
     (3, 1, 2, 0),
     (3, 2, 0, 1)
-])
+], sort=False)
 
-condorcet_cycle_with_loser = Profile([
+condorcet_cycle_with_loser = CompactProfile([
     (0, 1, 2, 3),
     (1, 2, 0, 3),
     (2, 0, 1, 3)
-])
+], sort=False)
 
-illustrative_ex1 = Profile([
+illustrative_ex1 = CompactProfile([
     (0,1,2,3),
     (0,2,1,3), 
     (1,3,2,0), 
     (2,1,3,0)
 ], 
-rcounts=[3, 5, 7, 6])
+rcounts=[3, 5, 7, 6], sort=False)
 
-illustrative_ex2 = Profile([
+illustrative_ex2 = CompactProfile([
     (0, 1, 2, 3),
     (1, 2, 3, 0),
     (3, 1, 2, 0),
     (2, 3, 0, 1)
 ], 
-rcounts=[7, 5, 4, 3])
+rcounts=[7, 5, 4, 3], sort=False)
 
-illustrative_ex3 = Profile([
+illustrative_ex3 = CompactProfile([
     (2, 1, 3, 0),
     (0, 2, 3, 1), 
     (1, 0, 2, 3), 
     (1, 0, 3, 2), 
     (3, 0, 2, 1)
 ], 
-rcounts=[1, 1, 1, 1, 1])
+rcounts=[1, 1, 1, 1, 1], sort=False)
 
 
 fixed_profiles = {
@@ -71,118 +87,249 @@ fixed_profiles = {
     "Illustrative Example 3": illustrative_ex3
     }
 
-def generate_mg_dot(profile, cmap):
-    candidates = profile.candidates
-    nodes = [cmap[_c] for _c in candidates]
-    edges = [(cmap[c1], cmap[c2], prof.margin(c1, c2))  
-           for c1 in candidates 
-           for c2 in candidates if c1 != c2 if profile.majority_prefers(c1, c2)]
-    node_strings ="\n".join([f'{n}[ label = "{n}" ];' for n in nodes])
-    edge_strings = "\n".join([f'{e[0]} -> {e[1]}[label="{e[2]}",weight="{e[2]}"];' for e in edges])
-    dot = '''digraph { \n layout="circo";\n''' + node_strings + "\n" + edge_strings + "}"
-    return dot
-   
-def generate_cycle_dot(cycle, profile, cmap):
-    candidates = cycle
-    nodes = [cmap[_c] for _c in candidates]
-    edges = list()
-    for cidx, c1 in enumerate(cycle[0:-1]): 
-        edges.append((cmap[c1], cmap[cycle[cidx+1]], profile.margin(c1, cycle[cidx+1])))
-    edges.append((cmap[cycle[-1]], cmap[cycle[0]], profile.margin(cycle[-1], cycle[0])))
-    node_strings ="\n".join([f'{n}[ label = "{n}" ];' for n in nodes])
-    edge_strings = "\n".join([f'{e[0]} -> {e[1]}[label="{e[2]}",weight="{e[2]}"];' for e in edges])
-    dot = '''digraph { \n layout="circo";\n''' + node_strings + "\n" + edge_strings + "}"
-    return dot
-
-def generate_sc_defeat_dot(sc_defeat, cmap):
-    candidates = sc_defeat.nodes
-    nodes = [cmap[_c] for _c in candidates]
-    edges = [(cmap[e[0]], cmap[e[1]]) for e in sc_defeat.edges]
-
-    node_strings ="\n".join([f'{n}[ label = "{n}" ];' for n in nodes])
-    edge_strings = "\n".join([f'{e[0]} -> {e[1]};' for e in edges])
-    dot = '''digraph { \n layout="circo";\n''' + node_strings + "\n" + edge_strings + "}"
-    return dot
-
-@st.cache_resource
-def gen_profile(num_cands, num_voters, fixed_profile=None):
-    print(fixed_profile)
-    if fixed_profile not in fixed_profiles.keys(): 
-        return generate_profile(num_cands, num_voters).anonymize()
+# cycles are enumerated lazily: at most MAX_CYCLES_LISTED are counted and listed
+MAX_CYCLES_LISTED = 100
+CYCLES_PER_PAGE = 10
+
+# the Split Cycle explanation draws this many cycles of discarded wins, and lists the others
+WITNESSES_SHOWN = 10
+
+def num_cycles_str(num_cycles, exact, noun):
+    if not exact:
+        return f"There are more than {num_cycles} {noun}s"
+    elif num_cycles == 1:
+        return f"There is {num_cycles} {noun}"
+    return f"There are {num_cycles} {noun}s"
+
+def select_cycles_page(cycle_analysis, key=None):
+    # with a key the reader can page through the cycles, otherwise only the first page is shown
+    num_cycles, exact = cycle_analysis.count(MAX_CYCLES_LISTED)
+    num_pages = -(-num_cycles // CYCLES_PER_PAGE)
+    page = 1
+    if key is not None and num_pages > 1:
+        page = st.number_input(f"Page of cycles (1-{num_pages})", min_value=1, max_value=num_pages, value=1, key=key)
+    elif num_pages > 1:
+        st.write(f"The first {CYCLES_PER_PAGE} cycles:")
+    if key is not None and not exact:
+        st.write(f"Only the first {MAX_CYCLES_LISTED} cycles are listed.")
+    return cycle_analysis.page(page - 1, CYCLES_PER_PAGE)
+
+# only this many ranking types are shown at once; larger profiles are paged, most common first
+BALLOT_TYPES_PER_PAGE = 20
+
+def show_profile(rankings, rcounts, cand_names, key, c1=None, c2=None, page_key=None):
+    num_types = len(rcounts)
+    if num_types > BALLOT_TYPES_PER_PAGE:
+        num_pages = -(-num_types // BALLOT_TYPES_PER_PAGE)
+        page = 1
+        if page_key is not None:
+            page = st.number_input(f"Page of rankings (1-{num_pages})", min_value=1, max_value=num_pages, value=1, key=page_key)
+        start = (page - 1) * BALLOT_TYPES_PER_PAGE
+        rankings, rcounts = ranking_types_by_count(rankings, rcounts, start, start + BALLOT_TYPES_PER_PAGE)
+        st.caption(f"Rankings {start + 1}-{start + len(rcounts)} of {num_types} distinct rankings (most common first).")
+    rankings = np.asarray(rankings)
+    # the rankings may list only some of the candidates (e.g., a reduced profile), with
+    # cand_names indexed by the original candidate numbers
+    num_cands = rankings.shape[1] if rankings.ndim == 2 else len(cand_names)
+    with span("display_profile", key=key):
+        display_profile(rankings, rcounts, num_cands, cand_names, c1=c1, c2=c2, key=key)
+
+def fragment(name):
+    # an interactive part of the page that reruns on its own when one of its widgets
+    # changes, timed as a partial rerun (or as a span of a full rerun)
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with span_or_run(f"fragment:{name}", rerun=st.session_state["reruns"]):
+                return f(*args, **kwargs)
+        return st.fragment(wrapper)
+    return decorator
+
+def show_diagram(analysis, kind, cmap, cycle=None):
+    # diagrams are rendered once per profile on the server when Graphviz is installed,
+    # otherwise the browser lays out the DOT source
+    dot, svg = analysis.diagram(kind, cmap, cycle=cycle)
+    if svg is not None:
+        st.image(svg)
+    else:
+        st.graphviz_chart(dot)
+
+@timed("gen_profile")
+def gen_profile(num_cands, num_voters, fixed_profile=None, seed=None, large_election=False, bank_index=None):
+    if bank_index is not None:
+        return exercise_bank.profile(num_cands, num_voters, bank_index)
+    if fixed_profile not in fixed_profiles.keys() and large_election: 
+        # kept as arrays: building a Profile for thousands of voters is too slow
+        return generate_compact_profile(num_cands, num_voters, seed=seed)
+    elif fixed_profile not in fixed_profiles.keys(): 
+        return generate_anonymized_profile(num_cands, num_voters, seed=seed)
     else: 
         return fixed_profiles[fixed_profile]
 
+def new_profile_settings(num_cands, num_voters, fixed_profile=None, large_election=False, require=()):
+    # a fresh seed for every generated profile, so that the profile can be reproduced
+    if fixed_profile in fixed_profiles.keys():
+        fixed_prof = fixed_profiles[fixed_profile]
+        return {"num_cands": len(fixed_prof.candidates), "num_voters": int(fixed_prof.num_voters), "fixed_profile": fixed_profile, "seed": None, "large_election": False, "bank_index": None}
+    if exercise_bank is not None and not large_election and (num_cands, num_voters) in exercise_bank:
+        # a profile from the bank is generated by its seed as well, and comes with its answers
+        bank_index = exercise_bank.sample(num_cands, num_voters, require)
+        if bank_index is not None:
+            return {"num_cands": num_cands, "num_voters": num_voters, "fixed_profile": None, "seed": exercise_bank.seed(num_cands, num_voters, bank_index), "large_election": False, "bank_index": bank_index}
+    if require:
+        st.sidebar.warning("There is no such profile in the exercise bank, so this is a random profile.")
+    return {"num_cands": num_cands, "num_voters": num_voters, "fixed_profile": None, "seed": int(np.random.SeedSequence().entropy % 2**32), "large_election": large_election, "bank_index": None}
+
+def link_key(profile_settings):
+    # the key of the profile in the link of the page (?profile=<key>): the name of a fixed
+    # profile, or the settings and seed of a generated profile (see profile_key)
+    if profile_settings["fixed_profile"] is not None:
+        return profile_settings["fixed_profile"]
+    return profile_key(profile_settings["num_cands"], profile_settings["num_voters"], profile_settings["seed"], profile_settings["large_election"])
+
+def settings_from_link_key(key):
+    if key in fixed_profiles:
+        return new_profile_settings(None, None, key)
+    num_cands, num_voters, seed, large_election = parse_profile_key(key)
+    max_cands, max_voters = (30, 10000) if large_election else (7, 15)
+    if not (2 <= num_cands <= max_cands and 1 <= num_voters <= max_voters):
+        raise ValueError(f"There are at most {max_cands} candidates and {max_voters} voters")
+    bank_index = None
+    if exercise_bank is not None and not large_election and (num_cands, num_voters) in exercise_bank:
+        bank_index = exercise_bank.index_of_seed(num_cands, num_voters, seed)
+    return {"num_cands": num_cands, "num_voters": num_voters, "fixed_profile": None, "seed": seed, "large_election": large_election, "bank_index": bank_index}
+
+# the profiles opened by several sessions (e.g., a class following the same link) are
+# generated once, and kept in a cache bounded by VM_TUTORIAL_PROFILE_CACHE_* (see cache_limits)
+# and in the analysis store shared with the other app processes, if there is one
+def shared_profile(key):
+    def generate():
+        if analysis_store is None:
+            return gen_profile(**settings_from_link_key(key))
+        return analysis_store.get_or_compute("generated profiles", key, lambda: gen_profile(**settings_from_link_key(key)))
+    return profile_cache.get_or_compute(key, generate, pinned=key in fixed_profiles)
+
+def profile_answers(profile_settings):
+    # the precomputed answers of a profile from the exercise bank
+    if profile_settings.get("bank_index") is None:
+        return None
+    return exercise_bank.answers(profile_settings["num_cands"], profile_settings["num_voters"], profile_settings["bank_index"])
+
+# random profiles with precomputed answers, built with
+#   python -m profile_analysis.bank exercise_bank.vmbank
+EXERCISE_BANK = os.environ.get("VM_TUTORIAL_EXERCISE_BANK", os.path.join(os.path.dirname(os.path.abspath(__file__)), "exercise_bank.vmbank"))
+
+@st.cache_resource(max_entries=1)
+def load_exercise_bank(path):
+    return ExerciseBank(path) if os.path.exists(path) else None
+
+exercise_bank = load_exercise_bank(EXERCISE_BANK)
+
+exercise_kinds = {
+    "Any profile": (),
+    "No Condorcet winner": ("no_condorcet_winner",),
+    "The voting methods disagree": ("methods_disagree",),
+    "Instant Runoff and Plurality disagree": ("irv_differs_from_plurality",),
+    "There is a majority cycle": ("majority_cycle",),
+}
+
 st.title("Voting Methods Tutorial")
 
+large_election = st.sidebar.toggle("Large election", help="Elections with up to 30 candidates and 10,000 voters. Only the most common rankings are displayed.")
+
 with st.sidebar.form("generate_profile"):
-   num_cands = st.slider("Number of candidates", min_value=2, max_value=7, value=3)
-   num_voters = st.slider("Number of Voters", min_value=1, max_value=15, value=5)
+   if large_election:
+       num_cands = st.slider("Number of candidates", min_value=2, max_value=30, value=10)
+       num_voters = st.number_input("Number of Voters", min_value=1, max_value=10000, value=1000, step=100)
+   else:
+       num_cands = st.slider("Number of candidates", min_value=2, max_value=7, value=3)
+       num_voters = st.slider("Number of Voters", min_value=1, max_value=15, value=5)
    
    fixed_profile_str = st.selectbox(
     'Choose a profile',
     tuple([""] + list(fixed_profiles.keys())))
+
+   exercise_kind = "Any profile"
+   if exercise_bank is not None and not large_election:
+       exercise_kind = st.selectbox("Kind of random profile", list(exercise_kinds))
    
    submitted = st.form_submit_button("Generate Profile")
-   if submitted:
-       if fixed_profile_str == "":
-           st.cache_resource.clear()
-       else:
-           num_cands = len(fixed_profiles[fixed_profile_str].candidates)
-           num_voters = fixed_profiles[fixed_profile_str].num_voters
 
+# the profile of this session is identified by the key in the link of the page, so the
+# link opens the same profile in another session
+requested_key = st.query_params.get("profile")
+profile_settings = None
+if submitted or ("prof" not in st.session_state and requested_key is None):
+    profile_settings = new_profile_settings(num_cands, num_voters, fixed_profile_str, large_election, exercise_kinds[exercise_kind])
+elif requested_key is not None and requested_key != st.session_state.get("profile_key"):
+    try:
+        profile_settings = settings_from_link_key(requested_key)
+    except ValueError as e:
+        st.sidebar.warning(f"The link does not give a profile ({e}), so this is a random profile.")
+        profile_settings = new_profile_settings(num_cands, num_voters, fixed_profile_str, large_election)
+if profile_settings is not None:
+    st.session_state["profile_settings"] = profile_settings
+    st.session_state["profile_key"] = link_key(profile_settings)
+    st.session_state["prof"] = shared_profile(st.session_state["profile_key"])
+if requested_key != st.session_state["profile_key"]:
+    st.query_params["profile"] = st.session_state["profile_key"]
+profile_settings = st.session_state["profile_settings"]
+
+if profile_settings["seed"] is not None:
+    st.sidebar.caption(f"Profile seed: {profile_settings['seed']}.  The link of this page opens this profile.")
 st.sidebar.write("Tutorial created by [Eric Pacuit](https://pacuit.org) for the course [PHPE 400](https://phpe400.info): Individual and Group Decision Making")
 
-print("regenerating....")
-prof = gen_profile(num_cands, num_voters, fixed_profile=fixed_profile_str)
+prof = st.session_state["prof"]
 num_cands, num_voters = len(prof.candidates), prof.num_voters
-c1, c2 = None, None
-print("prof is ", prof)
-#prof.display()
-_rs, _cs = prof.rankings_counts
-
-rs = [tuple([int(c) for c in r]) for r in _rs]
-cs = [int(nc) for nc in _cs]
+# the analysis is shared by every session looking at the same profile, and the
+# analyses of the fixed profiles are kept for the lifetime of the process
+analysis = get_analysis(prof, pinned=profile_settings["fixed_profile"] is not None, precomputed=profile_answers(profile_settings), key=st.session_state["profile_key"])
 cmap =  {c: string.ascii_letters[c] for c in prof.candidates}
 
-col1, col2 = st.columns(2)
-
-with col2: 
-    tab1, tab2 = st.tabs(["Margin Graph", "Margin Calculations"])
-
-    with tab1:
-        dot=generate_mg_dot(prof, cmap)
-        st.graphviz_chart(dot)
-
-    with tab2:
-        """The **margin** of a candidate $x$ over a candidate $y$, denoted $Margin(x, y)$, is the number of voters that rank $x$ above $y$ minus the number of voters that rank $y$ above $x$."""
-        """Candidate $x$ is  **majority preferred** to $y$ when $Margin(x, y)>0$."""
-        print( [(None, None)] + list(combinations(prof.candidates, 2)))
-        cands_for_margins = st.selectbox(
-            'Which candidates to compare head-to-head?',
-            [(None, None)] + list(combinations(prof.candidates, 2)), format_func = lambda cs : f"{cmap[cs[0]]} vs. {cmap[cs[1]]}" if (cs[0] is not None and cs[1] is not None) else "Select two candidates.")
-        c1, c2 = cands_for_margins
-        if c1 is not None and c2 is not None and prof.majority_prefers(c1, c2):  
-            st.markdown(f"${cmap[c1]}$ is majority preferred to ${cmap[c2]}$.") 
-            st.markdown(f"$Margin({cmap[c1]}, {cmap[c2]}) = {prof.support(c1, c2)} - {prof.support(c2, c1)} = {prof.margin(c1, c2)}$")
-            st.markdown(f"$Margin({cmap[c2]}, {cmap[c1]}) = {prof.support(c2, c1)} - {prof.support(c1, c2)} = {prof.margin(c2, c1)}$")
-        elif c1 is not None and c2 is not None and prof.majority_prefers(c2, c1): 
-            st.markdown(f"${cmap[c2]}$ is majority preferred to ${cmap[c1]}$.") 
-            st.markdown(f"$Margin({cmap[c2]}, {cmap[c1]}) = {prof.support(c2, c1)} - {prof.support(c1, c2)} = {prof.margin(c2, c1)}$")
-            st.markdown(f"$Margin({cmap[c1]}, {cmap[c2]}) = {prof.support(c1, c2)} - {prof.support(c2, c1)} = {prof.margin(c1, c2)}$")
-        elif c1 is not None and c2 is not None: 
-            st.markdown(f"The margin between ${cmap[c1]}$ and ${cmap[c2]}$ is 0. So, ${cmap[c1]}$ is not majority preferred to ${cmap[c2]}$ and ${cmap[c2]}$ is not majority preferred to ${cmap[c1]}$.") 
-            st.markdown(f"$Margin({cmap[c2]}, {cmap[c1]}) = {prof.support(c2, c1)} - {prof.support(c1, c2)} = {prof.margin(c2, c1)}$")
-            st.markdown(f"$Margin({cmap[c1]}, {cmap[c2]}) = {prof.support(c1, c2)} - {prof.support(c2, c1)} = {prof.margin(c1, c2)}$")
-
-with col1:
-    display_profile(rs, cs, int(num_cands), [cmap[c] for c in prof.candidates], c1=c1, c2=c2, key="p1")
-    #should_gen_profile = st.button(f"Generate another profile with {num_cands} candidates and {num_voters} voters")
-
-
-condorcet_winner = prof.condorcet_winner()
-condorcet_loser = prof.condorcet_loser()
-majority_winner = absolute_majority(prof)
-cycles = prof.cycles()
+@fragment("margins")
+def profile_and_margins(prof, analysis, cmap):
+    # choosing a pair reruns only this part: the pair is highlighted in the profile
+    support, margins, majority = analysis.support_matrix(), analysis.margin_matrix(), analysis.majority_matrix()
+    _rs, _cs = prof.rankings_counts
+    c1, c2 = None, None
+    col1, col2 = st.columns(2)
+
+    with col2: 
+        tab1, tab2 = st.tabs(["Margin Graph", "Margin Calculations"])
+
+        with tab1:
+            show_diagram(analysis, "margin_graph", cmap)
+
+        with tab2:
+            """The **margin** of a candidate $x$ over a candidate $y$, denoted $Margin(x, y)$, is the number of voters that rank $x$ above $y$ minus the number of voters that rank $y$ above $x$."""
+            """Candidate $x$ is  **majority preferred** to $y$ when $Margin(x, y)>0$."""
+            cands_for_margins = st.selectbox(
+                'Which candidates to compare head-to-head?',
+                [(None, None)] + list(combinations(prof.candidates, 2)), format_func = lambda cs : f"{cmap[cs[0]]} vs. {cmap[cs[1]]}" if (cs[0] is not None and cs[1] is not None) else "Select two candidates.")
+            c1, c2 = cands_for_margins
+            if c1 is not None and c2 is not None and majority[c1, c2]:  
+                st.markdown(f"${cmap[c1]}$ is majority preferred to ${cmap[c2]}$.") 
+                st.markdown(f"$Margin({cmap[c1]}, {cmap[c2]}) = {support[c1, c2]} - {support[c2, c1]} = {margins[c1, c2]}$")
+                st.markdown(f"$Margin({cmap[c2]}, {cmap[c1]}) = {support[c2, c1]} - {support[c1, c2]} = {margins[c2, c1]}$")
+            elif c1 is not None and c2 is not None and majority[c2, c1]: 
+                st.markdown(f"${cmap[c2]}$ is majority preferred to ${cmap[c1]}$.") 
+                st.markdown(f"$Margin({cmap[c2]}, {cmap[c1]}) = {support[c2, c1]} - {support[c1, c2]} = {margins[c2, c1]}$")
+                st.markdown(f"$Margin({cmap[c1]}, {cmap[c2]}) = {support[c1, c2]} - {support[c2, c1]} = {margins[c1, c2]}$")
+            elif c1 is not None and c2 is not None: 
+                st.markdown(f"The margin between ${cmap[c1]}$ and ${cmap[c2]}$ is 0. So, ${cmap[c1]}$ is not majority preferred to ${cmap[c2]}$ and ${cmap[c2]}$ is not majority preferred to ${cmap[c1]}$.") 
+                st.markdown(f"$Margin({cmap[c2]}, {cmap[c1]}) = {support[c2, c1]} - {support[c1, c2]} = {margins[c2, c1]}$")
+                st.markdown(f"$Margin({cmap[c1]}, {cmap[c2]}) = {support[c1, c2]} - {support[c2, c1]} = {margins[c1, c2]}$")
+
+    with col1:
+        show_profile(_rs, _cs, [cmap[c] for c in prof.candidates], c1=c1, c2=c2, key="p1", page_key="p1_page")
+
+profile_and_margins(prof, analysis, cmap)
+
+
+condorcet_winner = analysis.condorcet_winner()
+condorcet_loser = analysis.condorcet_loser()
+majority_winner = analysis.majority_winner()
+cycle_analysis = analysis.cycle_analysis()
 
 if len(majority_winner) == 1: 
     st.write(f"The majority winner is {cmap[majority_winner[0]]}.")
@@ -194,7 +341,7 @@ with st.expander("See explanation"):
 
         There are {prof.num_voters} voters in the election.  A candidate  is a majority winner if at least {prof.strict_maj_size()} voters rank that candidate in first place.""") 
     if len(majority_winner) == 1:
-        st.write(f"The number of voters that rank {cmap[majority_winner[0]]} in first place is {prof.plurality_scores()[majority_winner[0]]}.")
+        st.write(f"The number of voters that rank {cmap[majority_winner[0]]} in first place is {analysis.plurality_scores()[majority_winner[0]]}.")
     else: 
         st.write(f"No candidate is ranked in first place by at least {prof.strict_maj_size()} voters.")
 
@@ -203,361 +350,99 @@ if condorcet_winner is not None:
 else: 
     st.write(f"There is no Condorcet winner.")
 with st.expander("See explanation"):
-    st.write("""
-        The **Condorcet winner** is the candidate that is majority preferred to every other candidate.
-    """)
-
-    if condorcet_winner is None: 
-        for cand1 in prof.candidates: 
-            st.write(f"${cmap[cand1]}$ is not the Condorcet winner:")
-            for cand2 in prof.candidates: 
-                if cand1 != cand2: 
-                    if not prof.majority_prefers(cand1, cand2): 
-                        st.write(f"* Since $Margin({cmap[cand1]}, {cmap[cand2]}) = {prof.margin(cand1, cand2)}$, ${cmap[cand1]}$ is not majority preferred to ${cmap[cand2]}$")
-    else: 
-        for cand1 in prof.candidates: 
-            if condorcet_winner != cand1: 
-                st.write(f"* Since $Margin({cmap[condorcet_winner]}, {cmap[cand1]}) = {prof.margin(condorcet_winner, cand1)}$, ${cmap[condorcet_winner]}$ is  majority preferred to ${cmap[cand1]}$")
+    # each explanation is one markdown document, built once per profile
+    st.markdown(analysis.explanation("condorcet_winner", cmap))
 
 if condorcet_loser is not None: 
     st.write(f"The Condorcet loser is {cmap[condorcet_loser]}.")
 else: 
     st.write(f"There is no Condorcet loser.")
 with st.expander("See explanation"):
-    st.write("""
-        The **Condorcet loser** is the candidate such that every other candidate is majority preferred to that candidate.
-    """)
-
-    if condorcet_loser is None: 
-        for cand1 in prof.candidates: 
-            st.write(f"${cmap[cand1]}$ is not the Condorcet loser:")
-            for cand2 in prof.candidates: 
-                if cand1 != cand2: 
-                    if not prof.majority_prefers(cand2, cand1): 
-                        st.write(f"* Since $Margin({cmap[cand2]}, {cmap[cand1]}) = {prof.margin(cand2, cand1)}$, ${cmap[cand2]}$ is not majority preferred to ${cmap[cand1]}$")
-    else: 
-        for cand1 in prof.candidates: 
-            if condorcet_loser != cand1: 
-                st.write(f"* Since $Margin({cmap[cand1]}, {cmap[condorcet_loser]}) = {prof.margin(cand1, condorcet_loser)}$, ${cmap[cand1]}$ is  majority preferred to ${cmap[condorcet_loser]}$")
+    st.markdown(analysis.explanation("condorcet_loser", cmap))
 
-if len(cycles) == 0:
+if not cycle_analysis.has_cycles:
     st.write(f"There are no majority cycles in the profile.")
 else: 
-    if len(cycles) == 1: 
-        st.write(f"There is {len(cycles)} majority cycle in the profile.")
-    else: 
-        st.write(f"There are {len(cycles)} majority cycles in the profile.")
-with st.expander("See explanation"):
+    st.write(f"{num_cycles_str(*cycle_analysis.count(MAX_CYCLES_LISTED), 'majority cycle')} in the profile.")
+
+@fragment("cycles explanation")
+def cycles_explanation(analysis, cmap):
+    # paging through the cycles reruns only the explanation
+    cycle_analysis = analysis.cycle_analysis()
     st.write("A **majority cycle** (also called a **Condorcet cycle**) is a list of candidates $x_1, x_2, \ldots, x_k$ such that $x_1$ is majority preferred to $x_2$, $x_2$ is majority preferred to $x_3$, $\ldots$, $x_{k-1}$ is majority preferred to $x_k$, and $x_k$ is majority preferred to $x_1$.")
 
-    if len(cycles) > 0: 
-        for cycle in cycles: 
-            st.write(f"${', '.join([cmap[c] for c in cycle])}$ is a cycle: ")
-            for cidx, c in enumerate(cycle[0:-1]): 
-                st.write(f"* Since $Margin({cmap[c]}, {cmap[cycle[cidx+1]]}) = {prof.margin(c, cycle[cidx+1])}$, ${cmap[c]}$ is majority preferred to ${cmap[cycle[cidx+1]]}$")
-            st.write(f"* Since $Margin({cmap[cycle[-1]]}, {cmap[cycle[0]]}) = {prof.margin(cycle[-1], cycle[0])}$, ${cmap[cycle[-1]]}$ is majority preferred to ${cmap[cycle[0]]}$")
+    if cycle_analysis.has_cycles: 
+        st.write(f"The candidates on some majority cycle: {cand_list_str(cycle_analysis.cycle_candidates, cmap)}.")
+        st.markdown(analysis.explanation("cycles", cmap, cycles=select_cycles_page(cycle_analysis, key="cycles_page")))
+
+with st.expander("See explanation"):
+    cycles_explanation(analysis, cmap)
 
 st.subheader("Voting Methods")
 
-display_profile(rs, cs, int(num_cands), [cmap[c] for c in prof.candidates], c1=None, c2=None, key="p2")
-
-pl_tab, borda_tab, irv_tab, coombs_tab, minimax_tab, copeland_tab, sc_tab= st.tabs([
-    "Plurality", 
-    "Borda",  
-    "Instant Runoff", 
-    "Coombs", 
-    "Minimax", 
-    "Copeland", 
-    "Split Cycle"])
-
-with pl_tab: 
-    vm_string = "Plurality"
-    pl_ws = plurality(prof)
-    pl_submitted_winning_set = st.multiselect(
-        f'Which candidates are the {vm_string} winners?',
-        [cmap[c] for c in prof.candidates],
-        [])
-    if st.button(f"Check {vm_string} winners"):
-        if len(pl_submitted_winning_set) > 0: 
-            if same_candidate_sets(pl_ws, pl_submitted_winning_set, cmap):
-                st.success(f"Correct, the {vm_string} winning set is: {', '.join(pl_submitted_winning_set)}.")
-            else: 
-                for cname in pl_submitted_winning_set: 
-                    if not cname in [cmap[_c] for _c in pl_ws]: 
-                        st.error(f"${cname}$ is not a {vm_string} winner.")
-                for w in pl_ws: 
-                    if cmap[w] not in pl_submitted_winning_set:
-                        st.error(f"${cmap[w]}$ is a {vm_string} winner.")
-            st.write()
-        else: 
-            st.write("You must select some candidates.")
-        with st.expander(f"Explain the {vm_string} winners"):
-            st.write("The **Plurality score** of a candidate $x$ is the number of voters that rank $x$ in first place.   The candidate(s) with the largest Plurality score is a Plurality winner.")
-            plscores = prof.plurality_scores()
-            st.write(f"The largest Plurality score is {max(plscores.values())}")
-            for c in prof.candidates: 
-                st.write(f"* The Plurality score of ${cmap[c]}$ is ${plscores[c]}$ " + ("(winner)" if c in pl_ws else ""))
-
-with borda_tab: 
-    borda_ws = borda(prof)
-    b_submitted_winning_set = st.multiselect(
-        'Which candidates are the Borda winners?',
-        [cmap[c] for c in prof.candidates],
-        [])
-    if st.button("Check Borda winners"):
-        if len(b_submitted_winning_set) > 0: 
-            if same_candidate_sets(borda_ws, b_submitted_winning_set, cmap):
-                st.success(f"Correct, the Borda winning set is: {', '.join(b_submitted_winning_set)}.")
-            else: 
-                for cname in b_submitted_winning_set: 
-                    if not cname in [cmap[_c] for _c in borda_ws]: 
-                        st.error(f"${cname}$ is not a Borda winner.")
-                for w in borda_ws: 
-                    if cmap[w] not in b_submitted_winning_set:
-                        st.error(f"${cmap[w]}$ is a Borda winner.")
-            st.write()
-        else: 
-            st.write("You must select some candidates.")
-
-        scores = list(range(len(prof.candidates)-1, -1, -1))
-        #scores_str = ', '.join([f'{str(s)} points to the candidate ranked in ' for s in scores[0:-1]])
-        bscores = prof.borda_scores()
-        with st.expander("Explain the Borda winners"):
-            st.write(f"The **Borda score** for a candidate is determined as follows:  Each voter gives {scores[0]} points to the candidate ranked in first place, {scores[1]} points to the candidate ranked in 2nd place, $\\ldots$, and 0 points to the candidate ranked in last place.  The candidates overall Borda score is the sum of the Borda scores assigned from each voter.   The candidate(s) with the largest Borda score is a Borda winner.")
-
-            st.write(f"The largest Borda score is {max(bscores.values())}")
-            for c in prof.candidates: 
-                num_ranks = [prof.num_rank(c, l) for l in range(1, len(prof.candidates) + 1)]
-                bscore_str = ' + '.join([f"{str(x)} * {str(y)} " for x, y in zip(scores, num_ranks)])
-                st.write(f"* The Borda score of ${cmap[c]}$ is ${bscore_str} = {bscores[c]}$ " + ("(winner)" if c in borda_ws else ""))
-
-
-with irv_tab: 
-    vm_string = "Instant Runoff Voting"
-    irv_ws = instant_runoff(prof)
-    irv_submitted_winning_set = st.multiselect(
-        f'Which candidates are the {vm_string} winners?',
-        [cmap[c] for c in prof.candidates],
-        [])
-    if st.button(f"Check {vm_string} winners"):
-        if len(irv_submitted_winning_set) > 0: 
-            if same_candidate_sets(irv_ws, irv_submitted_winning_set, cmap):
-                st.success(f"Correct, the {vm_string} winning set is: {', '.join(irv_submitted_winning_set)}.")
-            else: 
-                for cname in irv_submitted_winning_set: 
-                    if not cname in [cmap[_c] for _c in irv_ws]: 
-                        st.error(f"${cname}$ is not a {vm_string} winner.")
-                for w in irv_ws: 
-                    if cmap[w] not in irv_submitted_winning_set:
-                        st.error(f"${cmap[w]}$ is a {vm_string}  winner.")
-            st.write()
-        else: 
-            st.write("You must select some candidates.")
-        with st.expander(f"Explain the {vm_string} winners"):
-            st.write("""The **Instant Runoff Voting** (also known as Ranked Choice Voting) winners are determined as follows.  If there is a candidate that is the majority winner, then that candidate is the Instant Runoff Voting winner.  Otherwise, iteratively remove all candidates with the fewest number of voters who rank them first, until there is a candidate who is a majority  winner.  Then that candidate is the Instant Runoff Voting winner.  If, at some stage of the removal process, all remaining candidates have the same number of  voters who rank them first (so all candidates would be removed), then all remaining candidates  are selected as Instant Runoff Voting winners.""")
-
-            st.write(f"The Instant Runoff Voting winners: {', '.join([cmap[w] for w in irv_ws])}.")
-            maj_winner = absolute_majority(prof)
-            
-            if len(maj_winner) == 1:
-                st.write(f"${cmap[maj_winner[0]]}$ is a majority winner.")
-
-            _, irv_exp = instant_runoff_with_explanation(prof)
-            all_cands_to_remove = list()
-            for r, cands_removed in enumerate(irv_exp):
-                all_cands_to_remove += cands_removed
-                reduced_prof, reduced_prof_cmap = prof.remove_candidates(all_cands_to_remove)
-                reduced_prof.display()
-
-                _rs_reduced, _cs_reduced = reduced_prof.rankings_counts
-                reduced_rs = [tuple([int(c) for c in _r]) for _r in _rs_reduced]
-                reduced_cs = [int(nc) for nc in _cs_reduced]
-                updated_cmap = {_c: cmap[reduced_prof_cmap[_c]] for _c in reduced_prof.candidates}
-                st.write(f"""*Round {r+1}*: The candidates with the fewest number of first place votes:  {', '.join([cmap[_c] for _c in cands_removed])}.  The profile with these candidates removed: 
-                """) 
-
-                display_profile(reduced_rs, reduced_cs, int(len(reduced_prof.candidates)), [updated_cmap[c] for c in reduced_prof.candidates], c1=None, c2=None, key=f"irv_p_{r}")
-
-                reduced_maj_winner = absolute_majority(reduced_prof)
-                if len(reduced_maj_winner) == 1: 
-                    st.write(f"{updated_cmap[reduced_maj_winner[0]]} is the majority winner in the reduced profile.")
-                else: 
-                    st.write(f"There is no candidate that is ranked in first place by a majority of voters in the reduced profile.")
-                st.write("")
-
-with coombs_tab: 
-    vm_string = "Coombs"
-    coombs_ws = coombs(prof)
-    coombs_submitted_winning_set = st.multiselect(
-        f'Which candidates are the {vm_string} winners?',
-        [cmap[c] for c in prof.candidates],
-        [])
-    if st.button(f"Check {vm_string} winners"):
-        if len(coombs_submitted_winning_set) > 0: 
-            if same_candidate_sets(coombs_ws, coombs_submitted_winning_set, cmap):
-                st.success(f"Correct, the {vm_string} winning set is: {', '.join(coombs_submitted_winning_set)}.")
-            else: 
-                for cname in coombs_submitted_winning_set: 
-                    if not cname in [cmap[_c] for _c in coombs_ws]: 
-                        st.error(f"${cname}$ is not a {vm_string} winner.")
-                for w in coombs_ws: 
-                    if cmap[w] not in coombs_submitted_winning_set:
-                        st.error(f"${cmap[w]}$ is a {vm_string}  winner.")
-            st.write()
-        else: 
-            st.write("You must select some candidates.")
-        with st.expander(f"Explain the {vm_string} winners"):
-            st.write("""The **Coombs** winners are determined as follows.  If there is a candidate that is the majority winner, then that candidate is the Coombs winner.  Otherwise, iteratively remove all candidates with the largest number of voters who rank them last, until there is a candidate who is a majority  winner.  Then that candidate is the Coombs winner.  If, at some stage of the removal process, all remaining candidates have the same number of  voters who rank them first (so all candidates would be removed), then all remaining candidates  are selected as Coombs winners.""")
-
-            st.write(f"The Coombs winners: {', '.join([cmap[w] for w in coombs_ws])}.")
-            maj_winner = absolute_majority(prof)
-
-            if len(maj_winner) == 1:
-                st.write(f"${cmap[maj_winner[0]]}$ is a majority winner.")
-                
-            _, coombs_exp = coombs_with_explanation(prof)
-            all_cands_to_remove = list()
-            for r, cands_removed in enumerate(coombs_exp):
-                all_cands_to_remove += cands_removed
-                reduced_prof, reduced_prof_cmap = prof.remove_candidates(all_cands_to_remove)
-                reduced_prof.display()
-
-                _rs_reduced, _cs_reduced = reduced_prof.rankings_counts
-                reduced_rs = [tuple([int(c) for c in _r]) for _r in _rs_reduced]
-                reduced_cs = [int(nc) for nc in _cs_reduced]
-                updated_cmap = {_c: cmap[reduced_prof_cmap[_c]] for _c in reduced_prof.candidates}
-                st.write(f"""* Round {r+1}: The candidates with the largest number of last place votes:  {', '.join([cmap[_c] for _c in cands_removed])}.  The profile with these candidates removed: 
-                """) 
-
-                display_profile(reduced_rs, reduced_cs, int(len(reduced_prof.candidates)), [updated_cmap[c] for c in reduced_prof.candidates], c1=None, c2=None, key=f"coombs_p_{r}")
-
-                reduced_maj_winner = absolute_majority(reduced_prof)
-                if len(reduced_maj_winner) == 1: 
-                    st.write(f"{updated_cmap[reduced_maj_winner[0]]} is the majority winner in the reduced profile.")
-                else: 
-                    st.write(f"There is no candidate that is ranked in first place by a majority of voters in the reduced profile.")
-                st.write("")
-
-with minimax_tab: 
-    vm_string = "Minimax"
-    minimax_ws = minimax(prof)
-    minimax_submitted_winning_set = st.multiselect(
-        f'Which candidates are the {vm_string} winners?',
-        [cmap[c] for c in prof.candidates],
-        [])
-    if st.button(f"Check {vm_string} winners"):
-        if len(minimax_submitted_winning_set) > 0: 
-            if same_candidate_sets(minimax_ws, minimax_submitted_winning_set, cmap):
-                st.success(f"Correct, the {vm_string} winning set is: {', '.join(minimax_submitted_winning_set)}.")
-            else: 
-                for cname in minimax_submitted_winning_set: 
-                    if not cname in [cmap[_c] for _c in minimax_ws]: 
-                        st.error(f"${cname}$ is not a {vm_string} winner.")
-                for w in minimax_ws: 
-                    if cmap[w] not in minimax_submitted_winning_set:
-                        st.error(f"${cmap[w]}$ is a {vm_string}  winner.")
-            st.write()
-        else: 
-            st.write("You must select some candidates.")
-        with st.expander(f"Explain the {vm_string} winners"):
-            st.write("""The **Minimax** winners are determined as follows. Say that the head-to-head loss of a candidate $x$ with a candidate $y$ is the margin of $y$ over $x$.  For each candidate, minimax score for that candidate is the largest head-to-head loss.  Any candidate  with the smallest minimax score is a winner.""")
-
-            dot = generate_mg_dot(prof, cmap)
-            st.graphviz_chart(dot)
-            st.write(f"The Minimax winners: {', '.join([cmap[w] for w in minimax_ws])}.")
-
-            minimax_data = {c:None for c in prof.candidates}
-            min_max_loss = len(prof.candidates)
-            for c in prof.candidates: 
-                max_loss = max([prof.margin(other_c, c) for other_c in prof.candidates])
-                if max_loss < min_max_loss: 
-                    min_max_loss = max_loss
-                minimax_data[c] = max_loss
-            
-            st.write(f"The minimum minimax score (i.e., the largest head-to-head loss) for any candidate is {min_max_loss}")
-
-            for c in prof.candidates:
-
-                if minimax_data[c] == 0: 
-                    st.write(f"* {cmap[c]} has no head-to-head losses, so the maximum loss is 0.")
-                else:
-                    st.write(f"* The largest head-to-head loss for {cmap[c]} is {minimax_data[c]} (against {', '.join([cmap[_c] for _c in prof.candidates if _c != c and prof.margin(_c, c)==minimax_data[c]])})")
-
-
-with copeland_tab: 
-    vm_string = "Copeland"
-    copeland_ws = copeland(prof)
-    copeland_submitted_winning_set = st.multiselect(
-        f'Which candidates are the {vm_string} winners?',
-        [cmap[c] for c in prof.candidates],
-        [])
-    if st.button(f"Check {vm_string} winners"):
-        if len(copeland_submitted_winning_set) > 0: 
-            if same_candidate_sets(copeland_ws, copeland_submitted_winning_set, cmap):
-                st.success(f"Correct, the {vm_string} winning set is: {', '.join(copeland_submitted_winning_set)}.")
-            else: 
-                for cname in copeland_submitted_winning_set: 
-                    if not cname in [cmap[_c] for _c in copeland_ws]: 
-                        st.error(f"${cname}$ is not a {vm_string} winner.")
-                for w in copeland_ws: 
-                    if cmap[w] not in copeland_submitted_winning_set:
-                        st.error(f"${cmap[w]}$ is a {vm_string}  winner.")
-            st.write()
-        else: 
-            st.write("You must select some candidates.")
-        with st.expander(f"Explain the {vm_string} winners"):
-            st.write("""The **Copeland** winners are determined as follows. Say that the **win-loss record** for a candidate $x$ is the number of candidates that $x$ is majority preferred to minus the number of candidates that is majority preferred to $y$.  Any candidate with the largest win-loss record is a Copeland winner.""")
-
-            dot = generate_mg_dot(prof, cmap)
-            st.graphviz_chart(dot)
-            st.write(f"The Copeland winners: {', '.join([cmap[w] for w in copeland_ws])}.")
-
-            max_win_loss = -np.infty
-            copeland_data = {c: None for c in prof.candidates}
-            for c in prof.candidates: 
-                cands_c_defeats = [other_c for other_c in prof.candidates if prof.majority_prefers(c, other_c)]
-                cands_c_loses = [other_c for other_c in prof.candidates if prof.majority_prefers(other_c, c)]
-                copeland_data[c] = (cands_c_defeats, cands_c_loses)
-                c_score = len(copeland_data[c][0]) - len(copeland_data[c][1])
-                if max_win_loss < c_score: 
-                    max_win_loss = c_score
-            
-            st.write(f"The maximum win-loss record for any candidate is {max_win_loss}")
-
-            for c in prof.candidates:
-
-                st.write(f"""* The win-loss record for {cmap[c]} is calculated as follows: 
-
-    Candidates that {cmap[c]} beats: {cand_list_str(copeland_data[c][0], cmap) if len(copeland_data[c][0]) > 0 else 'none'}. 
+@fragment("profile")
+def voting_methods_profile(prof, cmap):
+    # paging through the rankings reruns only the profile
+    _rs, _cs = prof.rankings_counts
+    show_profile(_rs, _cs, [cmap[c] for c in prof.candidates], c1=None, c2=None, key="p2", page_key="p2_page")
+
+voting_methods_profile(prof, cmap)
+
+def explain_irv(vm, prof, analysis, cmap):
+    irv_ws = analysis.winners(vm.name)
+    st.write("""The **Instant Runoff Voting** (also known as Ranked Choice Voting) winners are determined as follows.  If there is a candidate that is the majority winner, then that candidate is the Instant Runoff Voting winner.  Otherwise, iteratively remove all candidates with the fewest number of voters who rank them first, until there is a candidate who is a majority  winner.  Then that candidate is the Instant Runoff Voting winner.  If, at some stage of the removal process, all remaining candidates have the same number of  voters who rank them first (so all candidates would be removed), then all remaining candidates  are selected as Instant Runoff Voting winners.""")
+
+    st.write(f"The Instant Runoff Voting winners: {', '.join([cmap[w] for w in irv_ws])}.")
+    maj_winner = analysis.majority_winner()
     
-    Candidates that {cmap[c]} loses to: {cand_list_str(copeland_data[c][1], cmap) if len(copeland_data[c][1]) > 0 else 'none'}. 
+    if len(maj_winner) == 1:
+        st.write(f"${cmap[maj_winner[0]]}$ is a majority winner.")
 
-    The win-loss record for {cmap[c]} is ${len(copeland_data[c][0])} - {len(copeland_data[c][1])} = {len(copeland_data[c][0]) - len(copeland_data[c][1])}$ {'(winner)' if len(copeland_data[c][0]) - len(copeland_data[c][1]) == max_win_loss else ''}.""")
-                
+    _, irv_rounds = analysis.irv_rounds()
+    _rs, _cs = prof.rankings_counts
+    for r, elim_round in enumerate(irv_rounds):
+        cands_removed = elim_round["removed"]
+        st.write(f"""*Round {r+1}*: The candidates with the fewest number of first place votes:  {', '.join([cmap[_c] for _c in cands_removed])}.  The profile with these candidates removed: 
+        """) 
 
-with sc_tab: 
-    vm_string = "Split Cycle"
-    sc_ws = split_cycle(prof)
-    sc_submitted_winning_set = st.multiselect(
-        f'Which candidates are the {vm_string} winners?',
-        [cmap[c] for c in prof.candidates],
-        [])
-    if st.button(f"Check {vm_string} winners"):
-        if len(sc_submitted_winning_set) > 0: 
-            if same_candidate_sets(sc_ws, sc_submitted_winning_set, cmap):
-                st.success(f"Correct, the {vm_string} winning set is: {', '.join(sc_submitted_winning_set)}.")
-            else: 
-                for cname in sc_submitted_winning_set: 
-                    if not cname in [cmap[_c] for _c in sc_ws]: 
-                        st.error(f"${cname}$ is not a {vm_string} winner.")
-                for w in sc_ws: 
-                    if cmap[w] not in sc_submitted_winning_set:
-                        st.error(f"${cmap[w]}$ is a {vm_string}  winner.")
-            st.write()
+        show_profile(ballot_view(_rs, elim_round["remaining"]), _cs, [cmap[c] for c in prof.candidates], key=f"irv_p_{r}")
+
+        reduced_maj_winner = elim_round["majority_winner"]
+        if len(reduced_maj_winner) == 1: 
+            st.write(f"{cmap[reduced_maj_winner[0]]} is the majority winner in the reduced profile.")
+        else: 
+            st.write(f"There is no candidate that is ranked in first place by a majority of voters in the reduced profile.")
+        st.write("")
+
+def explain_coombs(vm, prof, analysis, cmap):
+    coombs_ws = analysis.winners(vm.name)
+    st.write("""The **Coombs** winners are determined as follows.  If there is a candidate that is the majority winner, then that candidate is the Coombs winner.  Otherwise, iteratively remove all candidates with the largest number of voters who rank them last, until there is a candidate who is a majority  winner.  Then that candidate is the Coombs winner.  If, at some stage of the removal process, all remaining candidates have the same number of  voters who rank them first (so all candidates would be removed), then all remaining candidates  are selected as Coombs winners.""")
+
+    st.write(f"The Coombs winners: {', '.join([cmap[w] for w in coombs_ws])}.")
+    maj_winner = analysis.majority_winner()
+
+    if len(maj_winner) == 1:
+        st.write(f"${cmap[maj_winner[0]]}$ is a majority winner.")
+        
+    _, coombs_rounds = analysis.coombs_rounds()
+    _rs, _cs = prof.rankings_counts
+    for r, elim_round in enumerate(coombs_rounds):
+        cands_removed = elim_round["removed"]
+        st.write(f"""* Round {r+1}: The candidates with the largest number of last place votes:  {', '.join([cmap[_c] for _c in cands_removed])}.  The profile with these candidates removed: 
+        """) 
+
+        show_profile(ballot_view(_rs, elim_round["remaining"]), _cs, [cmap[c] for c in prof.candidates], key=f"coombs_p_{r}")
+
+        reduced_maj_winner = elim_round["majority_winner"]
+        if len(reduced_maj_winner) == 1: 
+            st.write(f"{cmap[reduced_maj_winner[0]]} is the majority winner in the reduced profile.")
         else: 
-            st.write("You must select some candidates.")
-        with st.expander(f"Explain the {vm_string} winners"):
-            st.write("""The **Split Cycle** winners are determined as follows. 
+            st.write(f"There is no candidate that is ranked in first place by a majority of voters in the reduced profile.")
+        st.write("")
+
+def explain_split_cycle(vm, prof, analysis, cmap):
+    sc_ws = analysis.winners(vm.name)
+    st.write("""The **Split Cycle** winners are determined as follows. 
 
 1. In each majority cycle (if any), identify the head-to-head win(s) with the smallest margin of victory in that cycle. 
 2. After completing step 1 for all cycles, discard the identified wins. All remaining wins count as defeats of the losing candidates.
@@ -565,33 +450,143 @@ with sc_tab:
 The candidates with no defeats are the Split Cycle winners.
 """)
 
-            dot = generate_mg_dot(prof, cmap)
-            st.graphviz_chart(dot)
-            st.write(f"The Split Cycle winners: {', '.join([cmap[w] for w in sc_ws])}.")
-
-            sc_defeat = split_cycle_defeat(prof)
-            cycles = prof.cycles()
-
-            if len(cycles) == 0: 
-                st.write(f"""There are no cycles, so all wins count as defeats.
-                
-Candidate(s) with no defeats:  {cand_list_str([c1 for c1 in prof.candidates if len([c2 for c2 in prof.candidates if prof.majority_prefers(c2, c1)]) == 0], cmap)}.
-                """)
+    show_diagram(analysis, "margin_graph", cmap)
+    st.write(f"The Split Cycle winners: {', '.join([cmap[w] for w in sc_ws])}.")
 
-            else: 
-                if len(cycles) == 1:
-                    st.write(f"There is {len(cycles)} cycle: ")
-                else: 
-                    st.write(f"There are {len(cycles)} cycles: ")
-                for cycle in cycles: 
-                    cycle_dot=generate_cycle_dot(cycle, prof, cmap)
-                    st.graphviz_chart(cycle_dot)
-                    st.write(f"The smallest margin of victory in this cycle is {min([prof.margin(cycle[-1], cycle[0])] + [prof.margin(_c, cycle[_cidx+1]) for _cidx, _c in enumerate(cycle[0:-1])])}.")
-
-                st.write("After discarding the smallest margin of victory in each of the above cycles, the remaining wins count as defeats of the losing candidates.   The Split Cycle defeats: ")
-
-                sc_defeat_dot = generate_sc_defeat_dot(sc_defeat, cmap)
-                st.graphviz_chart(sc_defeat_dot)
-
-                st.write(f"The candidates with no defeats: {cand_list_str(sc_ws, cmap)}")
+    if not analysis.cycle_analysis().has_cycles: 
+        st.write(f"""There are no cycles, so all wins count as defeats.
+        
+Candidate(s) with no defeats:  {cand_list_str(np.flatnonzero(analysis.loss_counts() == 0), cmap)}.
+        """)
 
+    else: 
+        # one cycle for each discarded win is enough to explain it, so the cycles are not
+        # listed; wins with the same cycle (e.g., equal margins) are explained together
+        margins = analysis.margin_matrix()
+        witnesses = analysis.split_cycle_witnesses()
+        cycle_wins = dict()
+        for (c1, c2), cycle in witnesses.items():
+            start = cycle.index(min(cycle))
+            cycle_wins.setdefault(tuple(cycle[start:] + cycle[:start]), (cycle, list()))[1].append((c1, c2))
+        num_wins = "1 head-to-head win is" if len(witnesses) == 1 else f"{len(witnesses)} head-to-head wins are"
+        st.write(f"{num_wins} discarded, each because it has the smallest margin of victory in a cycle: ")
+        for cycle, wins in list(cycle_wins.values())[:WITNESSES_SHOWN]:
+            wins_str = ", ".join(f"{cmap[c1]} over {cmap[c2]}" for c1, c2 in wins)
+            st.write(f"{'The win of' if len(wins) == 1 else 'The wins of'} {wins_str} (margin {margins[wins[0]]}) {'has' if len(wins) == 1 else 'have'} the smallest margin of victory in this cycle:")
+            show_diagram(analysis, "cycle", cmap, cycle=cycle)
+        if len(cycle_wins) > WITNESSES_SHOWN:
+            st.write("The other discarded wins, with a cycle in which they have the smallest margin of victory: ")
+            st.markdown("\n".join(
+                f"* {', '.join(f'{cmap[c1]} over {cmap[c2]}' for c1, c2 in wins)} (margin {margins[wins[0]]}): {' → '.join(cmap[c] for c in cycle + cycle[:1])}"
+                for cycle, wins in list(cycle_wins.values())[WITNESSES_SHOWN:]))
+
+        st.write("After discarding these wins, the remaining wins count as defeats of the losing candidates.   The Split Cycle defeats: ")
+
+        show_diagram(analysis, "split_cycle_defeat", cmap)
+
+        st.write(f"The candidates with no defeats: {cand_list_str(sc_ws, cmap)}")
+
+def explain_winners(vm, prof, analysis, cmap):
+    # the description, the margin graph and the explanation document of the method
+    if vm.description is not None:
+        st.write(vm.description)
+    if vm.show_margin_graph:
+        show_diagram(analysis, "margin_graph", cmap)
+    if vm.explanation is not None:
+        st.markdown(analysis.explanation(vm.explanation, cmap))
+    else:
+        st.write(f"The {vm.name} winners: {cand_list_str(analysis.winners(vm.name), cmap)}.")
+
+# the methods whose explanations show more than their explanation document
+explainers = {
+    "Instant Runoff Voting": explain_irv,
+    "Coombs": explain_coombs,
+    "Split Cycle": explain_split_cycle,
+}
+
+# the workers start (and import pref_voting) with the first session, not with the first check
+background_pool.start()
+
+# seconds a partial rerun waits for the background workers before it shows a placeholder
+BACKGROUND_POLL_INTERVAL = 0.5
+
+def computed_in_background(analysis, items, what):
+    # a partial rerun shows a placeholder and reruns itself until the workers are done,
+    # a full rerun (which can't rerun a single fragment) waits for them
+    ctx = get_script_run_ctx()
+    if ctx is not None and ctx.fragment_ids_this_run:
+        status, detail = background_pool.status(analysis, items, wait=BACKGROUND_POLL_INTERVAL)
+        if status == "pending":
+            st.info(f"Computing {what}\u2026 ({detail:.0f} s)")
+            st.rerun(scope="fragment")
+    else:
+        with st.spinner(f"Computing {what}\u2026"):
+            status, detail = "pending", None
+            while status == "pending":
+                status, detail = background_pool.status(analysis, items, wait=background_pool.timeout)
+    if status == "too large":
+        st.warning(f"This profile is too large to compute {what}: it takes more than {detail:g} seconds.")
+    elif status == "error":
+        st.error(f"Could not compute {what} ({detail}).")
+    return status == "done"
+
+def method_section(vm, prof, analysis, cmap):
+    if not vm.supports(len(prof.candidates)):
+        st.info(f"The {vm.name} winners are only computed for profiles with at most {vm.max_candidates} candidates.")
+        return
+    submitted_winning_set = st.multiselect(
+        f'Which candidates are the {vm.name} winners?',
+        [cmap[c] for c in prof.candidates],
+        [])
+    # a check is pending while the winners are computed in the background, until the
+    # answer is shown or the page is rerun
+    check_key = f"check:{vm.name}"
+    if st.button(f"Check {vm.name} winners"):
+        st.session_state[check_key] = st.session_state["reruns"]
+    if st.session_state.get(check_key) == st.session_state["reruns"]:
+        items = [("winners", vm.name)]
+        if not vm.background or computed_in_background(analysis, items, f"the {vm.name} winners"):
+            ws = analysis.winners(vm.name)
+            show_feedback(winner_feedback(ws, submitted_winning_set, vm.name, cmap))
+            with st.expander(f"Explain the {vm.name} winners"):
+                explainers.get(vm.name, explain_winners)(vm, prof, analysis, cmap)
+        del st.session_state[check_key]
+
+# each tab reruns on its own when its answer is changed or checked
+method_sections = {vm_name: fragment(vm_name)(method_section) for vm_name in voting_methods}
+for tab, vm in zip(st.tabs([vm.label for vm in voting_methods.values()]), voting_methods.values()):
+    with tab:
+        method_sections[vm.name](vm, prof, analysis, cmap)
+
+
+run_timings = finish_run()
+
+# the memory of this session, without the profile and the analysis that it shares with the other sessions
+ctx = get_script_run_ctx()
+if ctx is not None:
+    session_footprints.report(ctx.session_id, deep_getsizeof({k: v for k, v in st.session_state.items() if k != "prof"}))
+
+# the timing panel is shown with ?debug=1 or when VM_TUTORIAL_DEBUG is set
+if st.query_params.get("debug") == "1" or os.environ.get("VM_TUTORIAL_DEBUG"):
+    with st.sidebar.expander("Timings", expanded=True):
+        st.write(f"Rerun {st.session_state['reruns']}: {run_timings.duration * 1000:.1f} ms")
+        st.dataframe(
+            [{"span": "\u2003" * row["depth"] + row["span"], "ms": round(row["ms"], 2)} for row in run_timings.breakdown()],
+            hide_index=True)
+        st.write("Rolling percentiles (all sessions)")
+        st.dataframe(
+            [{k: round(v, 2) if isinstance(v, float) else v for k, v in row.items()} for row in span_stats.summary()],
+            hide_index=True)
+    with st.sidebar.expander("Memory", expanded=True):
+        def mb(nbytes):
+            return None if nbytes is None else round(nbytes / 2**20, 2)
+        sessions = session_footprints.summary()
+        st.write(f"Sessions: {sessions['sessions']}, using {mb(sessions['bytes'])} MB (at most {mb(sessions['max_bytes'])} MB each)")
+        st.dataframe(
+            [{"cache": name, "entries": stats["entries"], "MB": mb(stats["bytes"]), "limit MB": mb(stats["max_bytes"]),
+              "hits": stats["hits"], "misses": stats["misses"], "evictions": stats["evictions"]}
+             for name, stats in (("analyses", analysis_cache.stats()), ("profiles", profile_cache.stats()))],
+            hide_index=True)
+        if analysis_store is not None:
+            stats = analysis_store.stats()
+            st.write(f"Analysis store: {stats['values']} values of {stats['profiles']} profiles, {mb(stats['bytes'])} MB")